@@ -0,0 +1,143 @@
+"""
+Filename: analytics.py
+Description: This file makes a report about the loaned books
+    (for example at the end of term):
+
+        - how many days are left on each loan
+        - which books are overdue
+        - how many overdue books each student has
+        - how long books have been out for (a histogram)
+
+    The due times and student names are put into numpy arrays so every
+    loan is worked out at once instead of one row at a time, which takes
+    milliseconds even for hundreds of thousands of loans.
+
+    numpy is only needed for the report (pip install numpy).
+"""
+
+# numpy is only needed for the report
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+ONE_DAY = 24 * 60 * 60
+
+# how many days each bar of the loan age histogram covers
+AGE_BIN_DAYS = 7
+
+# how many students are listed in the report
+TOP_STUDENTS = 10
+
+# how wide the longest histogram bar is (characters)
+BAR_WIDTH = 40
+
+
+def check_numpy():
+    if (numpy is None):
+        raise ImportError('numpy is needed for the loan report '
+                          '(pip install numpy)')
+
+
+def loan_arrays(loans):
+    """This function gets the due times and student names of the loaned
+    books in a list of catalogs (see catalog.py, one for each shard) as
+    numpy arrays, rows without a due time (gaps) are left out"""
+    check_numpy()
+
+    due_times = numpy.concatenate(
+        [numpy.array(catalog.due_times, dtype=numpy.float64)
+         for catalog in loans] + [numpy.zeros(0)])
+    loaned = ~numpy.isnan(due_times)
+
+    students = numpy.array([student for catalog in loans
+                            for student in catalog.students],
+                           dtype=object)[loaned]
+
+    return due_times[loaned], students
+
+
+def days_remaining(due_times, now):
+    """This function works out how many days are left on each loan
+    (negative if it is overdue)"""
+    return (due_times - now) / ONE_DAY
+
+
+def overdue_flags(due_times, now):
+    """This function works out which loans are overdue
+    (a book due right now counts as overdue, like due_index.overdue)"""
+    return due_times <= now
+
+
+def overdue_per_student(students, overdue):
+    """This function counts the overdue books of each student and
+    returns a list of (student, count), most overdue books first"""
+    names, counts = numpy.unique(students[overdue].astype(str),
+                                 return_counts=True)
+
+    # most first, students with the same count stay in name order
+    order = numpy.argsort(-counts, kind='stable')
+
+    return list(zip(names[order].tolist(), counts[order].tolist()))
+
+
+def loan_age_histogram(due_times, now, loan_time, bin_days=AGE_BIN_DAYS):
+    """This function counts how many books have been out for
+    0 - bin_days days, bin_days - 2 * bin_days days ...
+    and returns (counts, bin edges in days)"""
+    # when each book was loaned (its due time minus the loan time)
+    ages = numpy.clip((now - (due_times - loan_time)) / ONE_DAY, 0, None)
+
+    oldest = ages.max() if ages.size > 0 else 0
+    bin_count = int(oldest // bin_days) + 1
+
+    return numpy.histogram(ages, bins=bin_count,
+                           range=(0, bin_count * bin_days))
+
+
+class loan_report():
+    """The report worked out from the loaned books"""
+
+    def __init__(self, loans, now, loan_time):
+        """loans is a list of the loaned books' catalogs (see catalog.py)
+        loan_time is how long books are loaned for (seconds)"""
+        due_times, students = loan_arrays(loans)
+
+        self.loan_count = len(due_times)
+        self.days_left = days_remaining(due_times, now)
+        self.overdue = overdue_flags(due_times, now)
+        self.overdue_count = int(self.overdue.sum())
+        self.student_counts = overdue_per_student(students, self.overdue)
+        self.age_counts, self.age_edges = loan_age_histogram(
+            due_times, now, loan_time)
+
+    def print_report(self):
+        print('Books on loan: {}'.format(self.loan_count))
+        print('Books overdue: {}'.format(self.overdue_count))
+
+        if (self.loan_count > 0):
+            print('Average days left: {:.1f}'.format(
+                float(self.days_left.mean())))
+
+        if (self.student_counts != []):
+            print('\nStudents with the most overdue books:')
+
+            for student, count in self.student_counts[:TOP_STUDENTS]:
+                print('    {:<30} {}'.format(student, count))
+
+            if (len(self.student_counts) > TOP_STUDENTS):
+                print('    ... and {} more'.format(
+                    len(self.student_counts) - TOP_STUDENTS))
+
+        if (self.loan_count > 0):
+            print('\nHow long books have been out for (days):')
+
+            largest = max(int(self.age_counts.max()), 1)
+
+            for index in range(len(self.age_counts)):
+                count = int(self.age_counts[index])
+
+                print('    {:>4.0f} - {:<4.0f} {:>7} {}'.format(
+                    self.age_edges[index], self.age_edges[index + 1], count,
+                    '#' * round(count / largest * BAR_WIDTH)))
@@ -0,0 +1,188 @@
+"""
+Filename: batch_mode.py
+Description: This file runs a script of library commands without
+    asking for any input or waiting. Each line is one command
+    (written like a csv file):
+
+        add,<book name>,<F / NF>
+        loan,<book name>,<student name>
+        return,<book name>
+        returnall,<student name>   (returns every book the student has)
+        view,available   or   view,loaned
+        due,<days>       (days can be left out, it is 20 by default)
+        overdue
+        student,<student name>     (the books the student has)
+        report
+        compact          (deletes the gaps left by loaned / returned books)
+
+    Lines starting with # are ignored.
+
+    Adds, loans and returns that come one after another are run
+    together, so 30 loans in a row only move books once.
+"""
+
+import csv
+# other files
+from book_index import normalise
+from instrumentation import operation
+from library_changes import CHANGE_COMMANDS
+
+
+def read_commands(script_file):
+    """This function reads the commands in a script one at a time
+    and gives back (line number, command, arguments) for each"""
+    for line_number, row in enumerate(csv.reader(script_file), 1):
+
+        # skips blank lines and comments
+        if (row == [] or row[0].strip().startswith('#')):
+            continue
+
+        yield (line_number, row[0].strip().lower(),
+               [argument.strip() for argument in row[1:]])
+
+
+def script_error(line_number, message):
+    print('Line {}: {}'.format(line_number, message))
+
+
+def print_answers(group, answers, message):
+    """This function prints why the changes that could not be made were
+    not made, then message with how many were made (if any were)"""
+    made = 0
+
+    for (line_number, _, _), (status, body) in zip(group, answers):
+        if (status == 200):
+            made += 1
+            continue
+
+        error = body['error']
+
+        # the closest book names to a book that could not be found
+        if (body.get('suggestions', []) != []):
+            error += ' (did you mean {}?)'.format(
+                ' / '.join(body['suggestions']))
+
+        script_error(line_number, error)
+
+    if (made > 0):
+        print(message.format(made))
+
+
+# what each grouped command needs after it, what it is called in a change
+# and what is printed once changes have been made
+COMMAND_FIELDS = {'add': (['name', 'fiction'],
+                          'add needs a book name and F / NF',
+                          'Added {} book(s).'),
+                  'loan': (['name', 'student'],
+                           'loan needs a book and student name',
+                           'Loaned out {} book(s).'),
+                  'return': (['name'], 'return needs a book name',
+                             'Returned {} book(s).'),
+                  'returnall': (['student'], 'returnall needs a student name',
+                                'Returned the books of {} student(s).')}
+
+
+def run_view(manager, line_number, arguments):
+    if (arguments == ['available']):
+        manager.view_available()
+
+    elif (arguments == ['loaned']):
+        manager.view_loaned()
+
+    else:
+        script_error(line_number, 'view needs available or loaned')
+
+
+def run_due(manager, line_number, arguments):
+    days = 20
+
+    if (arguments != []):
+        try:
+            days = float(arguments[0])
+
+        except ValueError:
+            script_error(line_number, 'due needs a number of days')
+            return
+
+    manager.view_due(days)
+
+
+def run_overdue(manager, line_number, arguments):
+    manager.view_overdue()
+
+
+def run_student(manager, line_number, arguments):
+    if (len(arguments) != 1):
+        script_error(line_number, 'student needs a student name')
+        return
+
+    manager.view_student(normalise(arguments[0]))
+
+
+def run_report(manager, line_number, arguments):
+    manager.view_report()
+
+
+def run_compact(manager, line_number, arguments):
+    manager.compact()
+
+
+# commands that are run on their own
+SINGLE_COMMANDS = {'view': run_view,
+                   'due': run_due,
+                   'overdue': run_overdue,
+                   'student': run_student,
+                   'report': run_report,
+                   'compact': run_compact}
+
+
+def run_group(manager, group):
+    """This function runs a group of the same grouped command
+    (see library_changes.py)"""
+    command = group[0][1]
+    fields, usage, message = COMMAND_FIELDS[command]
+
+    # the lines that have the right number of arguments
+    changes = [dict(zip(fields, arguments)) for _, _, arguments in group
+               if len(arguments) == len(fields)]
+
+    answers = []
+    if (changes != []):
+        with operation('script {}'.format(command)):
+            answers = CHANGE_COMMANDS[command](manager, changes)
+
+    # the other lines are answered in the order they are in the script
+    answers = iter(answers)
+    print_answers(group, [next(answers) if len(arguments) == len(fields)
+                          else (400, {'error': usage})
+                          for _, _, arguments in group], message)
+
+
+def run_script(manager, script_file):
+    """This function runs every command in a script file"""
+    # gets what the other clerks have changed first
+    with operation('script sync'):
+        manager.sync()
+
+    # the grouped commands waiting to be run
+    group = []
+
+    for line_number, command, arguments in read_commands(script_file):
+
+        # runs the group when a different command comes up
+        if (group != [] and group[0][1] != command):
+            run_group(manager, group)
+            group = []
+
+        if (command in CHANGE_COMMANDS):
+            group.append((line_number, command, arguments))
+
+        elif (command in SINGLE_COMMANDS):
+            with operation('script {}'.format(command)):
+                SINGLE_COMMANDS[command](manager, line_number, arguments)
+
+        else:
+            script_error(line_number, 'unknown command {}'.format(command))
+
+    if (group != []):
+        run_group(manager, group)
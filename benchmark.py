@@ -0,0 +1,184 @@
+"""
+Filename: benchmark.py
+Description: This file times the library manager without the internet,
+    using the pretend spreadsheet in fake_sheets.py.
+
+    For each catalog size it fills both worksheets, then times
+    starting up, adding, loaning and returning books, getting rid of gaps
+    and viewing due books. For each one it shows the time taken,
+    how many requests were made and the most memory used.
+
+    Run it with: python benchmark.py
+    (python benchmark.py --help shows the options)
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import time
+import tracemalloc
+# other files
+from fake_sheets import fake_backend, quota_error
+from v3 import library_manager, find_book, delete_gaps
+
+
+# the catalog sizes that are timed by default
+SIZES = [10, 100, 1000, 10000, 100000]
+
+# how many books each operation works on
+BATCH = 10
+
+
+def measure(results, size, backend, operation, function):
+    """This function runs a function and adds how long it took,
+    how many requests it made and the most memory it used to results
+    (the function's result is returned)"""
+    calls_before = backend.call_count()
+
+    tracemalloc.start()
+    start_time = time.perf_counter()
+    error = ''
+    result = None
+
+    try:
+        # the operations print tables, which are not needed here
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = function()
+
+    except quota_error as quota_exceeded:
+        error = str(quota_exceeded)
+
+    seconds = time.perf_counter() - start_time
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    results.append({'size': size,
+                    'operation': operation,
+                    'seconds': seconds,
+                    'api_calls': backend.call_count() - calls_before,
+                    'peak_kb': peak_memory / 1024,
+                    'error': error})
+
+    return result
+
+
+def seed_library(backend, size):
+    """This function fills both worksheets with size books"""
+    now = time.time()
+    one_day = 24 * 60 * 60
+
+    backend.seed('available', [['book {}'.format(number),
+                                ['fiction', 'non fiction'][number % 2]]
+                               for number in range(size)])
+
+    # loans are due from 10 days ago to 30 days from now
+    backend.seed('loaned', [['loaned book {}'.format(number), 'fiction',
+                             'student {}'.format(number % 50),
+                             int(now + (number % 40 - 10) * one_day)]
+                            for number in range(size)])
+
+
+def benchmark_size(size, latency=0, reads_per_minute=None,
+                   writes_per_minute=None, shards=1):
+    """This function times every operation for one catalog size
+    (shards is how many shards the books are spread over, see shards.py)"""
+    results = []
+
+    backend = fake_backend(latency, reads_per_minute, writes_per_minute)
+    seed_library(backend, size)
+
+    manager = measure(results, size, backend, 'startup',
+                      lambda: library_manager(backend))
+
+    if (manager is None):
+        return results
+
+    # lets the benchmark go past the size of one google worksheet
+    manager.max_rows = size * 2 + 1000
+
+    # spreads the books over the shards (not timed)
+    if (shards > 1):
+        with contextlib.redirect_stdout(io.StringIO()):
+            manager.reshard(shards)
+
+    def locate(book_name, loaned):
+        shard = manager.shards.shard_for(book_name)
+        return shard, find_book(shard.books(loaned), book_name, 1)
+
+    # books spread out through the worksheet
+    step = max(size // BATCH, 1)
+    book_names = ['book {}'.format(number)
+                  for number in range(0, size, step)][:BATCH]
+
+    measure(results, size, backend, 'add_book',
+            lambda: manager.add_books([['new book {}'.format(number),
+                                        'fiction']
+                                       for number in range(BATCH)]))
+
+    measure(results, size, backend, 'loan_book',
+            lambda: manager.loan_rows(
+                [locate(book_name, False) for book_name in book_names],
+                ['student'] * len(book_names)))
+
+    measure(results, size, backend, 'return_book',
+            lambda: manager.return_rows(
+                [locate(book_name, True) for book_name in book_names]))
+
+    # makes gaps (not timed) so delete_gaps has something to do
+    available_books = manager.shards.shards[0].available_books
+    gap_rows = range(1, len(available_books.col_values(1)), step)
+    available_books.batch_clear(['A{}:Z{}'.format(row, row)
+                                 for row in gap_rows][:BATCH])
+
+    measure(results, size, backend, 'delete_gaps',
+            lambda: delete_gaps(available_books))
+
+    measure(results, size, backend, 'view_due', manager.view_due)
+
+    return results
+
+
+def print_results(results):
+    print('{:>8}  {:<12} {:>10} {:>10} {:>12}  {}'.format(
+        'size', 'operation', 'seconds', 'requests', 'peak memory', ''))
+
+    for result in results:
+        print('{:>8}  {:<12} {:>10.4f} {:>10} {:>9.0f} KB  {}'.format(
+            result['size'], result['operation'], result['seconds'],
+            result['api_calls'], result['peak_kb'], result['error']))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Library manager benchmark')
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES,
+                        help='catalog sizes to time')
+    parser.add_argument('--latency', type=float, default=0,
+                        help='seconds each request takes')
+    parser.add_argument('--reads-per-minute', type=int,
+                        help='read quota (no limit if left out)')
+    parser.add_argument('--writes-per-minute', type=int,
+                        help='write quota (no limit if left out)')
+    parser.add_argument('--shards', type=int, default=1,
+                        help='how many shards to spread the books over')
+    parser.add_argument('--json', metavar='FILE',
+                        help='also save the results to a json file')
+    arguments = parser.parse_args()
+
+    results = []
+
+    for size in arguments.sizes:
+        results += benchmark_size(size, arguments.latency,
+                                  arguments.reads_per_minute,
+                                  arguments.writes_per_minute,
+                                  arguments.shards)
+
+    print_results(results)
+
+    if (arguments.json is not None):
+        with open(arguments.json, 'w') as json_file:
+            json.dump(results, json_file, indent=4)
+
+
+if (__name__ == '__main__'):
+    main()
@@ -0,0 +1,84 @@
+"""
+Filename: book_index.py
+Description: This file has an index that stores which row each book is on
+    so that a book can be found without going through the whole coloumn.
+
+    The index is kept up to date by the worksheet cache,
+    which tells it every time a row is changed.
+"""
+
+
+def normalise(title):
+    """This function makes titles the same case and spacing
+    so 'The Hobbit ' and 'the hobbit' are the same book"""
+    return title.lower().strip()
+
+
+class book_index():
+
+    def __init__(self, col=1):
+        """col is the coloumn that the book names are stored in"""
+        self.col = col
+
+        # normalised title -> list of rows it is on (smallest first)
+        self.rows = {}
+
+    def cell(self, values):
+        """This function gets the indexed cell out of a row"""
+        if (len(values) >= self.col):
+            return values[self.col - 1]
+
+        return ''
+
+    def add(self, title, row):
+        if (title == ''):
+            return
+
+        title_rows = self.rows.setdefault(normalise(title), [])
+        title_rows.append(row)
+
+        # the same book is almost never on more than one row
+        # so sorting this is only needed for duplicates
+        if (len(title_rows) > 1):
+            title_rows.sort()
+
+    def remove(self, title, row):
+        if (title == ''):
+            return
+
+        key = normalise(title)
+        title_rows = self.rows.get(key, [])
+
+        if (row in title_rows):
+            title_rows.remove(row)
+
+            if (title_rows == []):
+                del self.rows[key]
+
+    def load(self, rows):
+        """This function builds the index from all the rows of a worksheet
+        (a catalog, see catalog.py)"""
+        self.rows = {}
+
+        titles = rows.column(self.col)
+
+        for index in range(len(titles)):
+            self.add(titles[index], index + 1)
+
+    def row_changed(self, row, old_values, new_values):
+        """This function is called by the cache when a row has changed"""
+        old_title = self.cell(old_values)
+        new_title = self.cell(new_values)
+
+        if (old_title != new_title):
+            self.remove(old_title, row)
+            self.add(new_title, row)
+
+    def find(self, title):
+        """This function returns the first row of a book (-1 if not found)"""
+        title_rows = self.rows.get(normalise(title))
+
+        if (title_rows):
+            return title_rows[0]
+
+        return -1
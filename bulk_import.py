@@ -0,0 +1,149 @@
+"""
+Filename: bulk_import.py
+Description: This file adds lots of books to the library from a file
+    without asking for each one.
+
+    The file can be a csv file (name, fiction) or a jsonl file
+    with one book on each line ({"name": ..., "fiction": ...}).
+    fiction can be f, nf, fiction or non fiction.
+
+    Books that are already in the library (or are in the file twice)
+    are not added, and neither are books that do not fit in the shard
+    they go in. The new books are added in large batches.
+"""
+
+import csv
+import json
+import time
+# other file
+from valid_input import valid_book
+
+
+# how many books are added to the worksheet at once
+IMPORT_BATCH_SIZE = 500
+
+
+def read_books(filename):
+    """This function reads the books in a file one at a time
+    and gives back (name, fiction) for each"""
+    with open(filename, newline='', encoding='utf-8') as book_file:
+
+        if (filename.endswith('.jsonl') or filename.endswith('.json')):
+            for line in book_file:
+                if (line.strip() != ''):
+                    book = json.loads(line)
+                    yield (str(book.get('name', '')),
+                           str(book.get('fiction', '')))
+
+        else:
+            for row in csv.reader(book_file):
+                # skips the header and blank lines
+                if (row == [] or row[0].strip().lower() == 'name'):
+                    continue
+
+                row += [''] * (2 - len(row))
+                yield row[0], row[1]
+
+
+def print_names(names, limit=10):
+    """This function prints the first few names of a list"""
+    for name in names[:limit]:
+        print('    {}'.format(name))
+
+    if (len(names) > limit):
+        print('    ...')
+
+
+class import_report():
+    """Keeps track of how the import went"""
+
+    def __init__(self):
+        self.added = 0
+        self.duplicates = []
+        self.invalid = []
+        self.no_space = []
+        self.start_time = time.time()
+        self.end_time = None
+
+    def finish(self):
+        self.end_time = time.time()
+
+    def print_report(self):
+        seconds = self.end_time - self.start_time
+
+        print('Added {} book(s) in {:.2f} seconds ({:.0f} books per second).'
+              .format(self.added, seconds, self.added / max(seconds, 1e-6)))
+
+        print('Rejected {} duplicate book(s).'.format(len(self.duplicates)))
+        print_names(self.duplicates)
+
+        print('Rejected {} invalid line(s).'.format(len(self.invalid)))
+        print_names(self.invalid)
+
+        if (self.no_space != []):
+            print('Rejected {} book(s) as the library does not have enough '
+                  'space.'.format(len(self.no_space)))
+            print_names(self.no_space)
+
+
+def import_books(manager, filename, batch_size=IMPORT_BATCH_SIZE):
+    """This function adds every new book in a file to the available
+    worksheet of its shard (see shards.py) and returns an import_report"""
+    report = import_report()
+    shards = manager.shards
+
+    # the books in the file that were already read,
+    # so a book in the file twice is not added twice
+    known_books = set()
+
+    # the new books waiting to be added to each shard
+    new_books = {}
+
+    # how many more books each shard can hold
+    # (found when the first book for the shard is read)
+    space = {}
+
+    for name, fiction in read_books(filename):
+        book = valid_book(name, fiction)
+
+        if (book is None):
+            report.invalid.append('{}, {}'.format(name.strip(),
+                                                  fiction.strip()))
+            continue
+
+        name = book[0]
+
+        # (including the books that are loaned out)
+        if (name in known_books or manager.has_book(name)):
+            report.duplicates.append(name)
+            continue
+
+        shard = shards.shard_for(name)
+
+        if (shard not in space):
+            space[shard] = manager.shard_space(shard)
+
+        # the books that do not fit are not written, or no more books
+        # could be added to the shard afterwards
+        if (space[shard] == 0):
+            report.no_space.append(name)
+            continue
+
+        space[shard] -= 1
+        known_books.add(name)
+
+        shard_books = new_books.setdefault(shard, [])
+        shard_books.append(book)
+
+        if (len(shard_books) >= batch_size):
+            shard.available_books.add_rows(shard_books)
+            report.added += len(shard_books)
+            del new_books[shard]
+
+    for shard, shard_books in new_books.items():
+        shard.available_books.add_rows(shard_books)
+        report.added += len(shard_books)
+
+    report.finish()
+
+    return report
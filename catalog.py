@@ -0,0 +1,362 @@
+"""
+Filename: catalog.py
+Description: This file stores the rows of a worksheet by coloumn instead
+    of as a list of lists of text, so a big catalog uses much less memory
+    and each value is only turned from text into its type once:
+
+        coloumn 1 (book name)     - a list of titles (interned)
+        coloumn 2 (fiction)       - an array of genre numbers
+        coloumn 3 (student name)  - a list of names (interned)
+        coloumn 4 (due time)      - an array of floats (nan if empty)
+
+    Cells that do not fit their coloumn's type, or are in any other
+    coloumn, are kept as text in other_cells, so every cell still reads
+    back exactly as it was written.
+"""
+
+import enum
+import math
+import sys
+from array import array
+# other file
+from storage import cell_text, trim_row
+
+
+# the coloumns that are stored with their own type
+TITLE_COL = 1
+GENRE_COL = 2
+STUDENT_COL = 3
+DUE_COL = 4
+
+EMPTY_DUE = float('nan')
+
+
+class genre(enum.IntEnum):
+    NONE = 0
+    FICTION = 1
+    NON_FICTION = 2
+
+
+# the text each genre is shown as in the worksheet (in genre order)
+GENRE_TEXT = ('', 'fiction', 'non fiction')
+
+GENRE_FROM_TEXT = {GENRE_TEXT[book_genre]: book_genre for book_genre in genre}
+
+
+def parse_due(text):
+    """This function turns due time text into a float,
+    None if it can not be stored as one and read back the same"""
+    if (text == ''):
+        return EMPTY_DUE
+
+    # whole numbers (how due times are written) always read back the same
+    if (text.isdigit() and text[0] != '0' and len(text) < 16):
+        return float(text)
+
+    try:
+        due_time = float(text)
+
+    except ValueError:
+        return None
+
+    if (math.isnan(due_time) or cell_text(due_time) != text):
+        return None
+
+    return due_time
+
+
+class book_record():
+    """One row of the catalog with each value as its type"""
+    __slots__ = ('row', 'title', 'genre', 'student', 'due_time')
+
+    def __init__(self, row, title, book_genre, student, due_time):
+        self.row = row
+        self.title = title
+        self.genre = book_genre
+        self.student = student
+        # None if the book is not loaned
+        self.due_time = due_time
+
+    def __repr__(self):
+        return '<book_record R{} {!r}>'.format(self.row, self.title)
+
+
+class catalog():
+
+    def __init__(self, rows=()):
+        """rows is a list of rows (lists of values) to start with"""
+        self.titles = []
+        self.genres = array('b')
+        self.students = []
+        self.due_times = array('d')
+
+        # row -> {col: text} for the cells that are not stored above
+        self.other_cells = {}
+
+        self.extend(rows)
+
+    @classmethod
+    def from_columns(cls, titles, genres, students, due_times, other_cells):
+        """This function makes a catalog from coloumns that are already
+        their types (like the ones saved in a snapshot, see snapshot.py)"""
+        rows = cls()
+        rows.titles = titles
+        rows.genres = genres
+        rows.students = students
+        rows.due_times = due_times
+        rows.other_cells = other_cells
+
+        return rows
+
+    def __len__(self):
+        return len(self.titles)
+
+    def __eq__(self, other):
+        # (the arrays are compared as bytes so empty due times are equal)
+        return (isinstance(other, catalog) and
+                self.titles == other.titles and
+                self.students == other.students and
+                self.genres.tobytes() == other.genres.tobytes() and
+                self.due_times.tobytes() == other.due_times.tobytes() and
+                self.other_cells == other.other_cells)
+
+    def append_row(self, values):
+        """This function adds a row to the end"""
+        self.extend([values])
+
+    def extend(self, rows):
+        """This function adds rows to the end, a coloumn at a time"""
+        first_row = len(self.titles) + 1
+
+        # most values are already text so only the others are changed
+        rows = [[value if type(value) is str else cell_text(value)
+                 for value in values] for values in rows]
+
+        def column_text(col):
+            return [values[col - 1] if len(values) >= col else ''
+                    for values in rows]
+
+        genres = [GENRE_FROM_TEXT.get(text)
+                  for text in column_text(GENRE_COL)]
+        due_times = [parse_due(text) for text in column_text(DUE_COL)]
+
+        self.titles += map(sys.intern, column_text(TITLE_COL))
+        self.genres.extend([genre.NONE if book_genre is None else book_genre
+                            for book_genre in genres])
+        self.students += map(sys.intern, column_text(STUDENT_COL))
+        self.due_times.extend([EMPTY_DUE if due_time is None else due_time
+                               for due_time in due_times])
+
+        # keeps the text of the cells that did not fit
+        for index in range(len(rows)):
+            if (genres[index] is not None and due_times[index] is not None
+                    and len(rows[index]) <= DUE_COL):
+                continue
+
+            values = rows[index]
+            others = {}
+
+            if (genres[index] is None):
+                others[GENRE_COL] = values[GENRE_COL - 1]
+
+            if (due_times[index] is None):
+                others[DUE_COL] = values[DUE_COL - 1]
+
+            for col in range(DUE_COL + 1, len(values) + 1):
+                if (values[col - 1] != ''):
+                    others[col] = values[col - 1]
+
+            if (others != {}):
+                self.other_cells[first_row + index] = others
+
+    def pop(self):
+        """This function gets rid of the last row"""
+        row = len(self.titles)
+
+        self.titles.pop()
+        self.genres.pop()
+        self.students.pop()
+        self.due_times.pop()
+        self.other_cells.pop(row, None)
+
+    def delete_rows(self, rows):
+        """This function takes rows out, the rows below them move up
+        (like deleting rows in a worksheet)"""
+        deleted = set(rows)
+        kept = [index for index in range(len(self.titles))
+                if index + 1 not in deleted]
+
+        # where each row that is kept moves to
+        new_rows = dict((index + 1, new_index + 1)
+                        for new_index, index in enumerate(kept))
+
+        self.titles = [self.titles[index] for index in kept]
+        self.genres = array('b', [self.genres[index] for index in kept])
+        self.students = [self.students[index] for index in kept]
+        self.due_times = array('d', [self.due_times[index]
+                                     for index in kept])
+        self.other_cells = dict((new_rows[row], cells) for row, cells
+                                in self.other_cells.items()
+                                if row in new_rows)
+
+    def trim(self):
+        """This function gets rid of empty rows at the bottom"""
+        while (len(self.titles) > 0 and
+                self.row_values(len(self.titles)) == []):
+            self.pop()
+
+    def set_value(self, row, col, text):
+        """This function changes one cell (rows and cols start at 1),
+        rows are added to the end if needed"""
+        while len(self.titles) < row:
+            self.append_row([])
+
+        index = row - 1
+
+        # the cell's old text is replaced
+        others = self.other_cells.get(row)
+        if (others is not None and col in others):
+            del others[col]
+
+            if (others == {}):
+                del self.other_cells[row]
+
+        # sorts out where the new text is kept
+        fits = True
+
+        if (col == TITLE_COL):
+            self.titles[index] = sys.intern(text)
+
+        elif (col == STUDENT_COL):
+            self.students[index] = sys.intern(text)
+
+        elif (col == GENRE_COL):
+            book_genre = GENRE_FROM_TEXT.get(text)
+            fits = book_genre is not None
+            self.genres[index] = book_genre or genre.NONE
+
+        elif (col == DUE_COL):
+            due_time = parse_due(text)
+            fits = due_time is not None
+            self.due_times[index] = EMPTY_DUE if due_time is None else due_time
+
+        else:
+            fits = text == ''
+
+        if (not fits):
+            self.other_cells.setdefault(row, {})[col] = text
+
+    def value(self, row, col):
+        """This function gets the text of one cell"""
+        if (row < 1 or row > len(self.titles)):
+            return ''
+
+        others = self.other_cells.get(row)
+        if (others is not None and col in others):
+            return others[col]
+
+        index = row - 1
+
+        if (col == TITLE_COL):
+            return self.titles[index]
+
+        if (col == STUDENT_COL):
+            return self.students[index]
+
+        if (col == GENRE_COL):
+            return GENRE_TEXT[self.genres[index]]
+
+        if (col == DUE_COL):
+            due_time = self.due_times[index]
+
+            if (math.isnan(due_time)):
+                return ''
+
+            return cell_text(due_time)
+
+        return ''
+
+    def row_values(self, row):
+        """This function gets the text of a row
+        (without the empty cells at the end)"""
+        if (row < 1 or row > len(self.titles)):
+            return []
+
+        index = row - 1
+        due_time = self.due_times[index]
+
+        values = [self.titles[index],
+                  GENRE_TEXT[self.genres[index]],
+                  self.students[index],
+                  '' if math.isnan(due_time) else cell_text(due_time)]
+
+        others = self.other_cells.get(row)
+        if (others is not None):
+            values += [''] * (max(others) - len(values))
+
+            for col in others:
+                values[col - 1] = others[col]
+
+        return trim_row(values)
+
+    def column(self, col):
+        """This function gets the text of every cell in a coloumn"""
+        if (col == TITLE_COL):
+            values = list(self.titles)
+
+        elif (col == STUDENT_COL):
+            values = list(self.students)
+
+        elif (col == GENRE_COL):
+            values = [GENRE_TEXT[book_genre] for book_genre in self.genres]
+
+        elif (col == DUE_COL):
+            values = ['' if math.isnan(due_time) else cell_text(due_time)
+                      for due_time in self.due_times]
+
+        else:
+            values = [''] * len(self.titles)
+
+        for row, others in self.other_cells.items():
+            if (col in others):
+                values[row - 1] = others[col]
+
+        return values
+
+    def numbers(self, col):
+        """This function gets every cell in a coloumn as a number
+        (None for cells that are not numbers)"""
+        if (col == DUE_COL):
+            return [self.due_time(row) for row in range(1, len(self) + 1)]
+
+        numbers = []
+
+        for text in self.column(col):
+            try:
+                numbers.append(float(text))
+
+            except ValueError:
+                numbers.append(None)
+
+        return numbers
+
+    def due_time(self, row):
+        """This function gets a row's due time (None if it does not have one)"""
+        due_time = self.due_times[row - 1]
+
+        if (not math.isnan(due_time)):
+            return due_time
+
+        # due times that were not written the usual way
+        try:
+            return float(self.other_cells[row][DUE_COL])
+
+        except (KeyError, ValueError):
+            return None
+
+    def record(self, row):
+        """This function gets a row as a book_record"""
+        index = row - 1
+
+        return book_record(row, self.titles[index], genre(self.genres[index]),
+                           self.students[index], self.due_time(row))
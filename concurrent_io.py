@@ -0,0 +1,67 @@
+"""
+Filename: concurrent_io.py
+Description: This file runs worksheet requests that do not depend on
+    each other at the same time (using a small pool of threads),
+    so an operation only takes as long as its slowest request
+    instead of all of its requests added together.
+"""
+
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+# the most requests that are sent at the same time
+MAX_WORKERS = 4
+
+# the pool is only made the first time it is needed
+pool = None
+pool_lock = threading.Lock()
+
+# remembers if the current thread is one of the pool's threads
+worker_state = threading.local()
+
+
+def mark_worker():
+    worker_state.is_worker = True
+
+
+def get_pool():
+    """This function gets the thread pool (making it if needed)"""
+    global pool
+
+    with pool_lock:
+        if (pool is None):
+            pool = ThreadPoolExecutor(max_workers=MAX_WORKERS,
+                                      thread_name_prefix='worksheet_io',
+                                      initializer=mark_worker)
+
+    return pool
+
+
+def run_together(*calls):
+    """This function runs each call at the same time and returns
+    their results in the same order as the calls
+    (each call is a tuple of the function then its arguments)
+
+    If one of the calls raises an error it is raised here
+    once all of the calls have finished"""
+    # there is nothing to wait on at the same time,
+    # and a pool thread waiting on the pool could get stuck
+    if (len(calls) == 1 or getattr(worker_state, 'is_worker', False)):
+        return [call[0](*call[1:]) for call in calls]
+
+    # each call gets a copy of this thread's context
+    # (so it knows which operation it is part of, see instrumentation.py)
+    futures = [get_pool().submit(contextvars.copy_context().run, *call)
+               for call in calls]
+
+    # waits for all of them before raising any errors
+    # so nothing is still running in the background
+    errors = [future.exception() for future in futures]
+
+    for error in errors:
+        if (error is not None):
+            raise error
+
+    return [future.result() for future in futures]
@@ -0,0 +1,118 @@
+"""
+Filename: delta_sync.py
+Description: This file keeps the local copy of the worksheets up to date
+    with the changes other clerks make, without downloading every row:
+
+        1. the spreadsheet's change version is checked (google drive
+           counts every change, so this is one small request), if it is
+           the same as last time nothing has changed
+        2. otherwise the stamp coloumn of every worksheet is downloaded
+           (one request), each row written by the library manager has a
+           short hash of the row in it (see worksheet_cache.row_stamp)
+        3. only the rows whose stamps are different to the local ones
+           are downloaded (one request for all of them)
+
+    Rows without a stamp (written before rows were stamped) are downloaded
+    and stamped the first time. Changes made in the spreadsheet by hand
+    do not change the stamps, so the worksheets are still downloaded in
+    full every so often (see CACHE_REFRESH_TIME in v3.py).
+"""
+
+# other files
+from storage import col_to_letter
+from worksheet_cache import STAMP_COL, row_runs
+
+
+class delta_sync():
+
+    def __init__(self, backend):
+        self.backend = backend
+
+        # the change version the last time the worksheets were checked
+        self.version = None
+
+    def sync(self, worksheets):
+        """This function downloads the rows that have been changed by
+        someone else and returns how many there were
+
+        worksheets is a list of caches that stamp their rows"""
+        # the worksheets that started from a snapshot and are still being
+        # downloaded are left out, the download brings them up to date
+        # (waiting for it would stop the snapshot being read until then)
+        reconciling = [worksheet for worksheet in worksheets
+                       if worksheet.reconciling()]
+        worksheets = [worksheet for worksheet in worksheets
+                      if worksheet not in reconciling]
+
+        if (worksheets == []):
+            return 0
+
+        # the stamps waiting to be sent are sent first, so the stamps of
+        # the rows changed here are the same as the ones in the worksheet
+        for worksheet in worksheets:
+            worksheet.flush()
+
+        version = self.backend.change_version()
+
+        if (version == self.version):
+            return 0
+
+        stamp_col = col_to_letter(STAMP_COL)
+
+        stamps = self.backend.batch_get_ranges(
+            [(worksheet.worksheet, '{0}1:{0}'.format(stamp_col))
+             for worksheet in worksheets])
+
+        # the ranges of rows to download and the stamps they have
+        ranges = []
+        worksheet_stamps = []
+
+        for worksheet, stamp_values in zip(worksheets, stamps):
+            stamp_values = [values[0] if values != [] else ''
+                            for values in stamp_values]
+            worksheet_stamps.append(stamp_values)
+
+            for first_row, last_row in row_runs(
+                    worksheet.changed_rows(stamp_values)):
+                ranges.append((worksheet, first_row, last_row))
+
+        if (ranges != []):
+            last_col = col_to_letter(STAMP_COL - 1)
+
+            ranges_values = self.backend.batch_get_ranges(
+                [(worksheet.worksheet,
+                  'A{}:{}{}'.format(first_row, last_col, last_row))
+                 for worksheet, first_row, last_row in ranges])
+
+        else:
+            ranges_values = []
+
+        # puts the rows into each worksheet together
+        changed_rows = dict((worksheet, {}) for worksheet in worksheets)
+
+        for (worksheet, first_row, last_row), values in zip(ranges,
+                                                            ranges_values):
+            for row in range(first_row, last_row + 1):
+                # empty rows at the end are not sent back
+                row_values = []
+                if (row - first_row < len(values)):
+                    row_values = values[row - first_row]
+
+                changed_rows[worksheet][row] = row_values
+
+        for worksheet, stamp_values in zip(worksheets, worksheet_stamps):
+            if (changed_rows[worksheet] != {}):
+                worksheet.apply_rows(changed_rows[worksheet], dict(
+                    (row, stamp_values[row - 1] if row <= len(stamp_values)
+                     else '') for row in changed_rows[worksheet]))
+
+                # sends the stamps of the rows that did not have one
+                # straight away, before anyone else changes them
+                worksheet.flush()
+
+        # the worksheets that were left out are checked the next time,
+        # even if nothing else changes before then
+        if (reconciling == []):
+            self.version = version
+
+        return sum([len(rows) for rows in changed_rows.values()])
@@ -0,0 +1,87 @@
+"""
+Filename: due_index.py
+Description: This file has an index of when loaned books are due,
+    kept in order of due time so that all the books due in a certain
+    time can be found with a binary search (bisect)
+    instead of checking every book.
+
+    Like book_index.py, it is kept up to date by the worksheet cache.
+"""
+
+import bisect
+
+
+class due_index():
+
+    def __init__(self, col=4):
+        """col is the coloumn that the due time stamps are stored in"""
+        self.col = col
+
+        # sorted list of (due time, row)
+        self.due_rows = []
+
+    def due_time(self, values):
+        """This function gets the due time out of a row
+        (None if the row does not have one)"""
+        if (len(values) < self.col):
+            return None
+
+        try:
+            return float(values[self.col - 1])
+
+        except ValueError:
+            return None
+
+    def load(self, rows):
+        """This function builds the index from all the rows of a worksheet
+        (a catalog, see catalog.py, which has already read the due times)"""
+        self.due_rows = []
+
+        due_times = rows.numbers(self.col)
+
+        for index in range(len(due_times)):
+            if (due_times[index] is not None):
+                self.due_rows.append((due_times[index], index + 1))
+
+        self.due_rows.sort()
+
+    def row_changed(self, row, old_values, new_values):
+        """This function is called by the cache when a row has changed"""
+        old_due = self.due_time(old_values)
+        new_due = self.due_time(new_values)
+
+        if (old_due == new_due):
+            return
+
+        if (old_due is not None):
+            position = bisect.bisect_left(self.due_rows, (old_due, row))
+
+            if (position < len(self.due_rows) and
+                    self.due_rows[position] == (old_due, row)):
+                self.due_rows.pop(position)
+
+        if (new_due is not None):
+            bisect.insort(self.due_rows, (new_due, row))
+
+    def due_between(self, start=None, end=None):
+        """This function returns the rows of the books due
+        between two times (None for no limit), soonest first"""
+        first = 0
+        last = len(self.due_rows)
+
+        if (start is not None):
+            first = bisect.bisect_left(self.due_rows, (start, 0))
+
+        if (end is not None):
+            # (end, inf) so that books due exactly at the end are included
+            last = bisect.bisect_right(self.due_rows, (end, float('inf')))
+
+        return [row for _, row in self.due_rows[first:last]]
+
+    def due_before(self, end):
+        """This function returns the rows of the books due by a time"""
+        return self.due_between(None, end)
+
+    def overdue(self, now):
+        """This function returns the rows of the books that are overdue"""
+        return self.due_between(None, now)
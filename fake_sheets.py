@@ -0,0 +1,139 @@
+"""
+Filename: fake_sheets.py
+Description: This file has a pretend google spreadsheet that is kept
+    in memory, so the library manager can be tested and timed
+    without the internet or a google account.
+
+    Every request to a fake worksheet is counted, can be made to
+    wait (to act like the internet) and is limited to a number of
+    requests per minute like google's quota.
+    The cells themselves are kept in an in memory sqlite database
+    (see storage.py).
+"""
+
+import threading
+import time
+from collections import Counter
+# other file
+from storage import (sqlite_backend, sqlite_worksheet,
+                     READ_FUNCTIONS, WRITE_FUNCTIONS)
+
+
+class quota_error(Exception):
+    """Raised when too many requests are made in a minute
+    (google sends back a 429 error when this happens)"""
+    status_code = 429
+
+
+class fake_backend(sqlite_backend):
+
+    def __init__(self, latency=0, reads_per_minute=None,
+                 writes_per_minute=None):
+        """latency is how many seconds each request waits for
+        reads_per_minute and writes_per_minute are the quotas
+        (None for no limit)"""
+        sqlite_backend.__init__(self, ':memory:')
+
+        self.latency = latency
+        self.quotas = {'read': reads_per_minute, 'write': writes_per_minute}
+
+        # how many times each function has been called
+        self.calls = Counter()
+
+        # the times of the requests in the last minute ('read' / 'write')
+        self.request_times = {'read': [], 'write': []}
+        self.request_lock = threading.Lock()
+
+        # how many writes have been made (see change_version)
+        self.write_count = 0
+
+    def open_worksheets(self, titles):
+        return [fake_worksheet(self, title) for title in titles]
+
+    def batch_get_values(self, worksheets):
+        # google sheets downloads every worksheet in one request
+        self.request('read', 'batch_get_values')
+
+        return [worksheet.sheet.get_all_values() for worksheet in worksheets]
+
+    def batch_get_ranges(self, ranges):
+        # google sheets downloads every range in one request
+        self.request('read', 'batch_get_ranges')
+
+        return [worksheet.sheet.get(range_name)
+                for worksheet, range_name in ranges]
+
+    def change_version(self):
+        # a request to google drive, which counts every change
+        self.request('read', 'change_version')
+
+        return self.write_count
+
+    def seed(self, title, rows):
+        """This function fills a worksheet without counting any requests
+        (it still counts as a change)"""
+        worksheet = sqlite_worksheet(self, title)
+        worksheet.clear()
+        worksheet.update('A1', rows)
+
+        self.write_count += 1
+
+    def request(self, kind, function_name):
+        """This function counts a request, checks the quota
+        and waits for the latency"""
+        with self.request_lock:
+            now = time.time()
+
+            # forgets requests older than a minute
+            recent = [request_time for request_time
+                      in self.request_times[kind] if now - request_time < 60]
+            self.request_times[kind] = recent
+
+            quota = self.quotas[kind]
+            if (quota is not None and len(recent) >= quota):
+                raise quota_error('Quota exceeded for {} requests '
+                                  'per minute'.format(kind))
+
+            recent.append(now)
+            self.calls[function_name] += 1
+
+            if (kind == 'write'):
+                self.write_count += 1
+
+        if (self.latency > 0):
+            time.sleep(self.latency)
+
+    def call_count(self):
+        return sum(self.calls.values())
+
+
+class fake_worksheet():
+    """A worksheet where every read and write is a request
+    (the cells are kept in a sqlite worksheet)"""
+
+    def __init__(self, backend, title):
+        self.backend = backend
+        self.sheet = sqlite_worksheet(backend, title)
+        self.title = title
+
+        # the same size as a new google worksheet
+        self.row_count = 1000
+        self.col_count = 26
+
+    def __getattr__(self, name):
+        if (name in READ_FUNCTIONS):
+            kind = 'read'
+
+        elif (name in WRITE_FUNCTIONS):
+            kind = 'write'
+
+        else:
+            raise AttributeError(name)
+
+        function = getattr(self.sheet, name)
+
+        def request(*arguments, **keyword_arguments):
+            self.backend.request(kind, name)
+            return function(*arguments, **keyword_arguments)
+
+        return request
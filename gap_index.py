@@ -0,0 +1,72 @@
+"""
+Filename: gap_index.py
+Description: This file has an index of the gaps in a worksheet (the empty
+    rows left behind when books are moved), so new books can be put in
+    them instead of after the last row, and the gaps only have to be
+    deleted once there are lots of them (see GAP_THRESHOLD in v3.py).
+
+    Like book_index.py, it is kept up to date by the worksheet cache.
+"""
+
+import bisect
+
+
+class gap_index():
+
+    def __init__(self, col=1):
+        """col is the coloumn that is empty in a gap (the book names)"""
+        self.col = col
+
+        # sorted list of the empty rows
+        self.gap_rows = []
+
+        # the last row the index knows about
+        self.last_row = 0
+
+    def is_gap(self, values):
+        return len(values) < self.col or values[self.col - 1] == ''
+
+    def load(self, rows):
+        """This function builds the index from all the rows of a worksheet
+        (a catalog, see catalog.py)"""
+        titles = rows.column(self.col)
+
+        self.gap_rows = [index + 1 for index in range(len(titles))
+                         if titles[index] == '']
+        self.last_row = len(titles)
+
+    def row_changed(self, row, old_values, new_values):
+        """This function is called by the cache when a row has changed"""
+        # the rows between the last row and this one were never written
+        # (a row further down was added), so they are gaps as well
+        if (row > self.last_row):
+            self.gap_rows += range(self.last_row + 1, row)
+            self.last_row = row
+
+            if (self.is_gap(new_values)):
+                self.gap_rows.append(row)
+
+            return
+
+        was_gap = self.is_gap(old_values)
+        is_gap = self.is_gap(new_values)
+
+        if (was_gap == is_gap):
+            return
+
+        position = bisect.bisect_left(self.gap_rows, row)
+
+        if (is_gap):
+            if (position == len(self.gap_rows) or
+                    self.gap_rows[position] != row):
+                self.gap_rows.insert(position, row)
+
+        elif (position < len(self.gap_rows) and
+                self.gap_rows[position] == row):
+            self.gap_rows.pop(position)
+
+    def gaps(self, last_row):
+        """This function returns the gaps above last_row (smallest first),
+        the empty rows at the bottom are cut off the worksheet
+        so they are not gaps any more"""
+        return self.gap_rows[:bisect.bisect_right(self.gap_rows, last_row)]
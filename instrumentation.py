@@ -0,0 +1,293 @@
+"""
+Filename: instrumentation.py
+Description: This file keeps track of every request made to the
+    worksheets: how many there are, how much data they send and
+    get back and how long they take.
+
+    Requests are grouped by the operation that made them
+    (like 'Loan Book', 'find_book' or 'delete_gaps'), so it is easy
+    to see which part of the program is using up the quota.
+    The stats can be printed at the end or saved as json.
+"""
+
+import contextlib
+import contextvars
+import functools
+import json
+import threading
+import time
+# other file
+from storage import READ_FUNCTIONS, WRITE_FUNCTIONS
+
+
+# the upper limits of the latency histogram buckets (milliseconds)
+HISTOGRAM_BUCKETS = [1, 2, 5, 10, 20, 50, 100, 200, 500,
+                     1000, 2000, 5000, float('inf')]
+
+# the operations that are currently running (innermost last)
+current_operations = contextvars.ContextVar('current_operations',
+                                            default=())
+
+
+@contextlib.contextmanager
+def operation(name):
+    """Requests made inside this are counted as part of the operation"""
+    token = current_operations.set(current_operations.get() + (name,))
+
+    try:
+        yield
+
+    finally:
+        current_operations.reset(token)
+
+
+def tracked(name):
+    """This function makes a decorator that counts a function's
+    requests as its own operation"""
+    def decorator(function):
+        @functools.wraps(function)
+        def tracked_function(*arguments, **keyword_arguments):
+            with operation(name):
+                return function(*arguments, **keyword_arguments)
+
+        return tracked_function
+
+    return decorator
+
+
+def payload_size(value):
+    """This function estimates how many bytes a value would be as json"""
+    if (value is None):
+        return 0
+
+    if (isinstance(value, str)):
+        return len(value.encode('utf-8')) + 2
+
+    if (isinstance(value, (list, tuple))):
+        return sum([payload_size(item) for item in value]) + len(value) + 1
+
+    if (isinstance(value, dict)):
+        return sum([payload_size(key) + payload_size(value[key])
+                    for key in value]) + len(value) + 1
+
+    # cells from range
+    if (hasattr(value, 'value')):
+        return payload_size(value.value)
+
+    return len(str(value))
+
+
+class request_stats():
+    """The stats for one worksheet function in one operation"""
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.total_seconds = 0
+        self.histogram = [0] * len(HISTOGRAM_BUCKETS)
+
+    def add(self, seconds, bytes_sent, bytes_received, failed):
+        self.calls += 1
+        self.errors += failed
+        self.bytes_sent += bytes_sent
+        self.bytes_received += bytes_received
+        self.total_seconds += seconds
+
+        milliseconds = seconds * 1000
+
+        for bucket in range(len(HISTOGRAM_BUCKETS)):
+            if (milliseconds <= HISTOGRAM_BUCKETS[bucket]):
+                self.histogram[bucket] += 1
+                break
+
+    def percentile(self, fraction):
+        """This function estimates a latency percentile (in milliseconds)
+        from the histogram, as the top of the bucket it falls in"""
+        target = fraction * self.calls
+        count = 0
+
+        for bucket in range(len(HISTOGRAM_BUCKETS)):
+            count += self.histogram[bucket]
+
+            if (count >= target):
+                return HISTOGRAM_BUCKETS[bucket]
+
+        return HISTOGRAM_BUCKETS[-1]
+
+    def to_dict(self):
+        return {'calls': self.calls,
+                'errors': self.errors,
+                'bytes_sent': self.bytes_sent,
+                'bytes_received': self.bytes_received,
+                'total_seconds': self.total_seconds,
+                'histogram_ms': dict(zip([str(bucket) for bucket
+                                          in HISTOGRAM_BUCKETS],
+                                         self.histogram))}
+
+
+class session_stats():
+    """All the request stats for one run of the program"""
+
+    def __init__(self):
+        # (operation, worksheet function) -> request_stats
+        self.requests = {}
+        self.lock = threading.Lock()
+        self.start_time = time.time()
+
+    def record(self, function_name, seconds, bytes_sent, bytes_received,
+               failed=False):
+        operations = current_operations.get()
+
+        # requests are counted under the innermost operation
+        operation_name = 'other'
+        if (operations != ()):
+            operation_name = operations[-1]
+
+        with self.lock:
+            key = (operation_name, function_name)
+
+            if (key not in self.requests):
+                self.requests[key] = request_stats()
+
+            self.requests[key].add(seconds, bytes_sent, bytes_received,
+                                   failed)
+
+    def total_calls(self):
+        return sum([stats.calls for stats in self.requests.values()])
+
+    def print_summary(self):
+        print('Requests made this session: {}'.format(self.total_calls()))
+        print('{:<30} {:<17} {:>6} {:>10} {:>10} {:>8} {:>8}'.format(
+            'operation', 'request', 'calls', 'sent', 'received',
+            'p50 ms', 'p95 ms'))
+
+        for key in sorted(self.requests):
+            stats = self.requests[key]
+
+            print('{:<30} {:<17} {:>6} {:>10} {:>10} {:>8} {:>8}'.format(
+                key[0], key[1], stats.calls, stats.bytes_sent,
+                stats.bytes_received, stats.percentile(0.5),
+                stats.percentile(0.95)))
+
+    def to_dict(self):
+        return {'start_time': self.start_time,
+                'total_calls': self.total_calls(),
+                'requests': [dict(operation=key[0], request=key[1],
+                                  **self.requests[key].to_dict())
+                             for key in sorted(self.requests)]}
+
+    def export_json(self, filename):
+        with open(filename, 'w') as json_file:
+            json.dump(self.to_dict(), json_file, indent=4)
+
+
+class instrumented_worksheet():
+    """Wraps a worksheet so every request it makes is recorded"""
+
+    def __init__(self, worksheet, stats):
+        self.worksheet = worksheet
+        self.stats = stats
+
+    def __getattr__(self, name):
+        attribute = getattr(self.worksheet, name)
+
+        if (name not in READ_FUNCTIONS and name not in WRITE_FUNCTIONS):
+            return attribute
+
+        def recorded_request(*arguments):
+            start_time = time.perf_counter()
+            result = None
+            failed = False
+
+            try:
+                result = attribute(*arguments)
+                return result
+
+            except Exception:
+                failed = True
+                raise
+
+            finally:
+                self.stats.record(name, time.perf_counter() - start_time,
+                                  payload_size(list(arguments)),
+                                  payload_size(result), failed)
+
+        return recorded_request
+
+
+class instrumented_backend():
+    """Wraps a backend so every worksheet it opens is instrumented"""
+
+    def __init__(self, backend, stats):
+        self.backend = backend
+        self.stats = stats
+
+    def open_worksheets(self, titles):
+        start_time = time.perf_counter()
+
+        worksheets = self.backend.open_worksheets(titles)
+
+        self.stats.record('open_worksheets', time.perf_counter() - start_time,
+                          payload_size(titles), 0)
+
+        return [instrumented_worksheet(worksheet, self.stats)
+                for worksheet in worksheets]
+
+    def batch_get_values(self, worksheets):
+        start_time = time.perf_counter()
+
+        worksheets_values = self.backend.batch_get_values(
+            [worksheet.worksheet for worksheet in worksheets])
+
+        self.stats.record('batch_get_values',
+                          time.perf_counter() - start_time,
+                          payload_size([worksheet.title
+                                        for worksheet in worksheets]),
+                          payload_size(worksheets_values))
+
+        return worksheets_values
+
+    def batch_get_ranges(self, ranges):
+        start_time = time.perf_counter()
+
+        values = self.backend.batch_get_ranges(
+            [(worksheet.worksheet, range_name)
+             for worksheet, range_name in ranges])
+
+        self.stats.record('batch_get_ranges',
+                          time.perf_counter() - start_time,
+                          payload_size([range_name for _, range_name
+                                        in ranges]),
+                          payload_size(values))
+
+        return values
+
+    def change_version(self):
+        start_time = time.perf_counter()
+
+        version = self.backend.change_version()
+
+        self.stats.record('change_version', time.perf_counter() - start_time,
+                          0, payload_size(version))
+
+        return version
+
+    def worksheet_titles(self, look_up=False):
+        start_time = time.perf_counter()
+
+        titles = self.backend.worksheet_titles(look_up)
+
+        self.stats.record('worksheet_titles', time.perf_counter() - start_time,
+                          0, payload_size(titles))
+
+        return titles
+
+    def add_worksheets(self, titles):
+        start_time = time.perf_counter()
+
+        self.backend.add_worksheets(titles)
+
+        self.stats.record('add_worksheets', time.perf_counter() - start_time,
+                          payload_size(titles), 0)
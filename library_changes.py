@@ -0,0 +1,210 @@
+"""
+Filename: library_changes.py
+Description: This file makes a group of the same change to the library
+    (adding, loaning or returning books, or returning every book some
+    students have) for scripts (batch_mode.py) and the service (server.py),
+    so both check and make the changes the same way.
+
+    Each change is a dict of what was given for it:
+        add       - {'name': ..., 'fiction': ...}
+        loan      - {'name': ..., 'student': ...}
+        return    - {'name': ...}
+        returnall - {'student': ...}
+
+    An answer is given back for each change as (status, body) like a web
+    request would get (nothing is printed, so the service can run them
+    while it answers other requests):
+        200 - the change was made
+        400 - the book is not valid
+        404 - the book (or student) could not be found, the closest book
+              names are in body['suggestions']
+        409 - the change could not be made (body['error'] says why)
+"""
+
+# other files
+from book_index import normalise
+from valid_input import valid_book
+
+
+def error(status, message, suggestions=None):
+    """This function makes the answer for a change that was not made"""
+    body = {'error': message}
+
+    if (suggestions is not None):
+        body['suggestions'] = suggestions
+
+    return status, body
+
+
+def run_adds(manager, changes):
+    """This function adds the books of a group of add changes"""
+    answers = [None] * len(changes)
+    new_books = []
+
+    # the changes that are adding a book
+    adding = []
+
+    # the books in this group, so the same book is not added twice
+    book_names = set()
+
+    for index, change in enumerate(changes):
+        book = valid_book(change['name'], change['fiction'])
+
+        if (book is None):
+            answers[index] = error(400, 'not a valid book')
+
+        elif (book[0] in book_names or manager.has_book(book[0])):
+            answers[index] = error(409, '{} has already been added to the '
+                                        'library'.format(book[0]))
+
+        else:
+            book_names.add(book[0])
+            new_books.append(book)
+            adding.append(index)
+
+    if (new_books == []):
+        return answers
+
+    # nothing is added unless every book fits
+    added = manager.add_books(new_books)
+
+    for index, book in zip(adding, new_books):
+        if (added):
+            answers[index] = (200, {'added': book[0]})
+
+        else:
+            answers[index] = error(409, 'the library does not have '
+                                        'enough space')
+
+    return answers
+
+
+def run_moves(manager, changes, loaned):
+    """This function loans (or returns if loaned is True)
+    the books of a group of loan (or return) changes"""
+    answers = [None] * len(changes)
+    book_rows = []
+    student_names = []
+
+    # the changes that are moving a book
+    moving = []
+
+    for index, change in enumerate(changes):
+        book_name = normalise(change['name'])
+        student_name = normalise(change.get('student', ''))
+
+        shard = manager.shards.shard_for(book_name)
+        book_row = shard.books(loaned).find_row(book_name, 1)
+
+        if (book_row == -1 and
+                shard.books(not loaned).find_row(book_name, 1) != -1):
+            answers[index] = error(409, '{} is already {}'.format(
+                book_name, 'returned' if loaned else 'loaned'))
+
+        elif (book_row == -1):
+            answers[index] = error(404, 'could not find {}'.format(book_name),
+                                   manager.shards.suggest(book_name, loaned))
+
+        elif ((shard, book_row) in book_rows):
+            answers[index] = error(409, '{} is already being {}'.format(
+                book_name, 'returned' if loaned else 'loaned'))
+
+        # (with the books being loaned to them in this group)
+        elif (not loaned and manager.loan_limit_reached(
+                student_name, student_names.count(student_name))):
+            answers[index] = error(409, '{} already has {} books '
+                                        'loaned'.format(student_name,
+                                                        manager.max_loans))
+
+        else:
+            book_rows.append((shard, book_row))
+            student_names.append(student_name)
+            moving.append(index)
+
+    if (book_rows == []):
+        return answers
+
+    # the names (as they are in the worksheet) of the books that
+    # someone else loaned or returned first
+    if (loaned):
+        changed_books = manager.return_rows(book_rows)
+
+    else:
+        changed_books = manager.loan_rows(book_rows, student_names)
+
+    changed_books = set([normalise(book_name)
+                         for book_name in changed_books])
+
+    for index, student_name in zip(moving, student_names):
+        book_name = normalise(changes[index]['name'])
+
+        if (book_name in changed_books):
+            answers[index] = error(409, '{} was just changed by someone '
+                                        'else'.format(book_name))
+
+        elif (loaned):
+            answers[index] = (200, {'returned': book_name})
+
+        else:
+            answers[index] = (200, {'loaned': book_name,
+                                    'student': student_name})
+
+    return answers
+
+
+def run_loans(manager, changes):
+    return run_moves(manager, changes, False)
+
+
+def run_returns(manager, changes):
+    return run_moves(manager, changes, True)
+
+
+def run_return_students(manager, changes):
+    """This function returns every book of the students
+    of a group of returnall changes"""
+    answers = [None] * len(changes)
+    book_rows = []
+
+    # the names of each student's books (for the changes with books)
+    student_books = {}
+
+    for index, change in enumerate(changes):
+        student_rows = manager.shards.student_rows(change['student'])
+
+        if (student_rows == []):
+            answers[index] = error(404, '{} does not have any books '
+                                        'loaned'.format(
+                                            normalise(change['student'])))
+            continue
+
+        student_books[index] = [shard.loaned_books.value(row, 1)
+                                for shard, row in student_rows]
+        book_rows += [book_row for book_row in student_rows
+                      if book_row not in book_rows]
+
+    if (book_rows == []):
+        return answers
+
+    # (every book is moved together)
+    changed_books = set([normalise(book_name) for book_name
+                         in manager.return_rows(book_rows)])
+
+    for index, book_names in student_books.items():
+        answers[index] = (200, {'returned': [book_name for book_name
+                                             in book_names
+                                             if normalise(book_name)
+                                             not in changed_books],
+                                'changed': [book_name for book_name
+                                            in book_names
+                                            if normalise(book_name)
+                                            in changed_books]})
+
+    return answers
+
+
+# the changes that can be made in groups, and how a group is made
+CHANGE_COMMANDS = {'add': run_adds,
+                   'loan': run_loans,
+                   'return': run_returns,
+                   'returnall': run_return_students}
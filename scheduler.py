@@ -0,0 +1,354 @@
+"""
+Filename: scheduler.py
+Description: This file sits in front of the worksheets and makes sure
+    the program stays inside google's quota (requests per minute):
+
+        - requests wait for a token from a token bucket, so they are
+          spread out instead of all being sent at once
+        - requests that fail because of the quota (429) or a google
+          server error are tried again, waiting twice as long each
+          time (plus a random amount so clerks do not all retry together)
+        - writes that would be made twice if they were sent again
+          (appending and deleting rows) are only tried again after a 429,
+          a server error can come back after google has already made them
+        - reads that are waiting at the same time are sent together
+          in one request, and reads of the same or touching ranges
+          are merged into one range
+"""
+
+import random
+import threading
+import time
+from concurrent.futures import Future
+# other file
+from storage import (parse_range, col_to_letter, trim_row,
+                     READ_FUNCTIONS, WRITE_FUNCTIONS)
+
+
+# google's quota for each user (requests per minute)
+READS_PER_MINUTE = 60
+WRITES_PER_MINUTE = 60
+
+# how many requests can be sent straight away before having to wait
+BURST = 10
+
+# the http status codes that mean the request can be tried again
+RETRY_STATUS_CODES = [429, 500, 502, 503, 504]
+
+# the status codes that mean google did not make the request at all
+# (over the quota), so writes that are not safe to repeat can be retried
+QUOTA_STATUS_CODES = [429]
+
+# the writes that add or take away rows, so sending one twice
+# adds the books twice or deletes the rows that moved up
+UNREPEATABLE_WRITES = ['append_rows', 'delete_row_ranges']
+
+# how many times a request is tried before giving up
+MAX_ATTEMPTS = 6
+
+# how long to wait before the first retry, and the longest wait (seconds)
+FIRST_RETRY_DELAY = 1
+MAX_RETRY_DELAY = 32
+
+# how long a read waits for other reads to join it (seconds)
+COALESCE_WINDOW = 0.002
+
+
+class request_failed(Exception):
+    """Raised when a request still fails after every retry"""
+
+
+def status_code(error):
+    """This function gets the http status code from a request error
+    (gspread's APIError keeps it on the response)"""
+    code = getattr(error, 'status_code', None)
+
+    if (code is None and getattr(error, 'response', None) is not None):
+        code = getattr(error.response, 'status_code', None)
+
+    return code
+
+
+class token_bucket():
+
+    def __init__(self, rate_per_minute, capacity=BURST):
+        """rate_per_minute is the quota, the bucket refills a bit slower
+        than it so a burst plus a minute of refills stays under it"""
+        self.capacity = min(capacity, rate_per_minute)
+        self.rate = max(rate_per_minute - self.capacity, 1) / 60
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """This function waits until a token is available and takes it"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity,
+                                  self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+
+                if (self.tokens >= 1):
+                    self.tokens -= 1
+                    return
+
+                wait = (1 - self.tokens) / self.rate
+
+            time.sleep(wait)
+
+
+class request_scheduler():
+
+    def __init__(self, reads_per_minute=READS_PER_MINUTE,
+                 writes_per_minute=WRITES_PER_MINUTE,
+                 max_attempts=MAX_ATTEMPTS,
+                 coalesce_window=COALESCE_WINDOW):
+        self.buckets = {'read': token_bucket(reads_per_minute),
+                        'write': token_bucket(writes_per_minute)}
+        self.max_attempts = max_attempts
+        self.coalesce_window = coalesce_window
+
+        # how many requests have been tried again
+        self.retries = 0
+
+    def call(self, kind, function, *arguments,
+             retry_codes=RETRY_STATUS_CODES):
+        """This function sends a request ('read' or 'write'),
+        waiting for the quota and retrying it if it fails with
+        one of retry_codes"""
+        delay = FIRST_RETRY_DELAY
+
+        for attempt in range(1, self.max_attempts + 1):
+            self.buckets[kind].acquire()
+
+            try:
+                return function(*arguments)
+
+            except Exception as error:
+                if (status_code(error) not in RETRY_STATUS_CODES):
+                    raise
+
+                # google may have made it (the next sync shows if it did)
+                if (status_code(error) not in retry_codes):
+                    raise request_failed('Request failed with {}, it was '
+                                         'not sent again'.format(
+                                             status_code(error))) from error
+
+                if (attempt == self.max_attempts):
+                    raise request_failed('Request failed after {} attempts'
+                                         .format(attempt)) from error
+
+            self.retries += 1
+
+            # waits between half and all of the delay
+            time.sleep(delay * random.uniform(0.5, 1))
+            delay = min(delay * 2, MAX_RETRY_DELAY)
+
+
+def merge_ranges(ranges):
+    """This function merges ranges with the same coloumns that overlap
+    or touch (like A1:B5 and A6:B9) and returns a list of
+    (merged range name, first row, the original ranges in it)"""
+    # (first_col, last_col) -> list of (first_row, last_row, range name)
+    column_groups = {}
+
+    for range_name in ranges:
+        first_row, first_col, last_row, last_col = parse_range(range_name)
+
+        column_groups.setdefault((first_col, last_col), []).append(
+            (first_row, last_row, range_name))
+
+    merged = []
+
+    for (first_col, last_col), group in column_groups.items():
+        # ranges with no last row go on to the end of the sheet
+        group.sort(key=lambda item: (item[0], item[1] is None,
+                                     item[1] or 0))
+
+        current = None
+
+        for first_row, last_row, range_name in group:
+            if (current is not None and
+                    (current[1] is None or first_row <= current[1] + 1)):
+                # grows the current range to include this one
+                if (current[1] is not None and
+                        (last_row is None or last_row > current[1])):
+                    current[1] = last_row
+
+                current[2].append(range_name)
+
+            else:
+                current = [first_row, last_row, [range_name]]
+                merged.append((first_col, last_col, current))
+
+    merged_ranges = []
+
+    for first_col, last_col, (first_row, last_row, range_names) in merged:
+        # (like gspread, 'A5:5' is all of row 5 and 'D1:D' is all of D)
+        merged_name = '{}{}:{}{}'.format(
+            col_to_letter(first_col), first_row,
+            col_to_letter(last_col) if last_col is not None else '',
+            last_row if last_row is not None else '')
+
+        merged_ranges.append((merged_name, first_row, range_names))
+
+    return merged_ranges
+
+
+def slice_rows(rows, merged_first_row, range_name):
+    """This function gets the rows of an original range
+    out of the rows of the merged range it was put in"""
+    first_row, _, last_row, _ = parse_range(range_name)
+
+    start = first_row - merged_first_row
+    end = None
+    if (last_row is not None):
+        end = last_row - merged_first_row + 1
+
+    values = [list(row) for row in rows[start:end]]
+
+    # empty rows at the end are left out like the sheets API does
+    while values != [] and values[-1] == []:
+        values.pop()
+
+    return values
+
+
+class scheduled_worksheet():
+    """Wraps a worksheet so every request goes through the scheduler"""
+
+    def __init__(self, worksheet, scheduler):
+        self.worksheet = worksheet
+        self.scheduler = scheduler
+
+        # the reads waiting to be sent (range name -> Future)
+        self.open_batch = None
+        self.lock = threading.Lock()
+
+    def __getattr__(self, name):
+        attribute = getattr(self.worksheet, name)
+
+        if (name in READ_FUNCTIONS):
+            kind = 'read'
+
+        elif (name in WRITE_FUNCTIONS):
+            kind = 'write'
+
+        else:
+            return attribute
+
+        retry_codes = RETRY_STATUS_CODES
+        if (name in UNREPEATABLE_WRITES):
+            retry_codes = QUOTA_STATUS_CODES
+
+        def scheduled_request(*arguments):
+            return self.scheduler.call(kind, attribute, *arguments,
+                                       retry_codes=retry_codes)
+
+        return scheduled_request
+
+    # --- reads that can be sent together ---
+
+    def get(self, range_name):
+        return self.queue_read(range_name)
+
+    def col_values(self, col):
+        letter = col_to_letter(col)
+        rows = self.queue_read('{}1:{}'.format(letter, letter))
+
+        return trim_row([row[0] if row != [] else '' for row in rows])
+
+    def row_values(self, row):
+        rows = self.queue_read('A{}:{}'.format(row, row))
+
+        if (rows == []):
+            return []
+
+        return rows[0]
+
+    def queue_read(self, range_name):
+        """This function adds a read to the next batch and waits for it,
+        the first read in a batch waits a moment for others to join
+        then sends the whole batch"""
+        with self.lock:
+            is_sender = self.open_batch is None
+
+            if (is_sender):
+                self.open_batch = {}
+
+            batch = self.open_batch
+
+            if (range_name not in batch):
+                batch[range_name] = Future()
+
+            future = batch[range_name]
+
+        if (is_sender):
+            if (self.scheduler.coalesce_window > 0):
+                time.sleep(self.scheduler.coalesce_window)
+
+            # no more reads can join this batch
+            with self.lock:
+                self.open_batch = None
+
+            self.send_batch(batch)
+
+        return future.result()
+
+    def send_batch(self, batch):
+        """This function gets every read in a batch with one request"""
+        merged_ranges = merge_ranges(list(batch))
+
+        try:
+            results = self.scheduler.call(
+                'read', self.worksheet.batch_get,
+                [merged_name for merged_name, _, _ in merged_ranges])
+
+        except Exception as error:
+            for future in batch.values():
+                future.set_exception(error)
+            return
+
+        for (merged_name, first_row, range_names), rows in zip(merged_ranges,
+                                                               results):
+            for range_name in range_names:
+                batch[range_name].set_result(
+                    slice_rows(rows, first_row, range_name))
+
+
+class scheduled_backend():
+    """Wraps a backend so every worksheet it opens uses the scheduler"""
+
+    def __init__(self, backend, scheduler):
+        self.backend = backend
+        self.scheduler = scheduler
+
+    def open_worksheets(self, titles):
+        worksheets = self.scheduler.call('read', self.backend.open_worksheets,
+                                         titles)
+
+        return [scheduled_worksheet(worksheet, self.scheduler)
+                for worksheet in worksheets]
+
+    def batch_get_values(self, worksheets):
+        return self.scheduler.call(
+            'read', self.backend.batch_get_values,
+            [worksheet.worksheet for worksheet in worksheets])
+
+    def batch_get_ranges(self, ranges):
+        return self.scheduler.call(
+            'read', self.backend.batch_get_ranges,
+            [(worksheet.worksheet, range_name)
+             for worksheet, range_name in ranges])
+
+    def change_version(self):
+        return self.scheduler.call('read', self.backend.change_version)
+
+    def worksheet_titles(self, look_up=False):
+        return self.scheduler.call('read', self.backend.worksheet_titles,
+                                   look_up)
+
+    def add_worksheets(self, titles):
+        return self.scheduler.call('write', self.backend.add_worksheets,
+                                   titles)
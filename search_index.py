@@ -0,0 +1,269 @@
+"""
+Filename: search_index.py
+Description: This file has an index of the book names in a worksheet
+    for finding books when the name is not typed exactly:
+
+        - complete finds every book starting with what has been typed
+          (a binary search of the sorted names, used for tab completion)
+        - suggest finds the books closest to a misspelled name, only
+          looking closely at names that share 3 letter pieces (trigrams)
+          with it and stopping once they are too far apart
+
+    Like book_index.py, it is kept up to date by the worksheet cache.
+"""
+
+import bisect
+# other file
+from book_index import normalise
+
+
+# how many letters can be wrong for a book to be suggested
+MAX_DISTANCE = 2
+
+# the most books that are suggested or completed
+SUGGESTION_LIMIT = 5
+
+
+def trigrams(title):
+    """This function splits a name into overlapping 3 letter pieces
+    (spaces are added to the ends so short names have some too)"""
+    padded = '  ' + title + ' '
+
+    return {padded[start:start + 3] for start in range(len(padded) - 2)}
+
+
+def edit_distance(first, second, max_distance):
+    """This function counts how many letters have to be added, removed
+    or changed to turn one name into the other (Levenshtein distance),
+    it stops and returns max_distance + 1 once it is too far apart"""
+    if (abs(len(first) - len(second)) > max_distance):
+        return max_distance + 1
+
+    previous = list(range(len(second) + 1))
+
+    for first_index in range(1, len(first) + 1):
+        current = [first_index] + [0] * len(second)
+
+        for second_index in range(1, len(second) + 1):
+            changed = first[first_index - 1] != second[second_index - 1]
+
+            current[second_index] = min(previous[second_index] + 1,
+                                        current[second_index - 1] + 1,
+                                        previous[second_index - 1] + changed)
+
+        # every way through is already too far
+        if (min(current) > max_distance):
+            return max_distance + 1
+
+        previous = current
+
+    return min(previous[-1], max_distance + 1)
+
+
+class search_index():
+
+    def __init__(self, col=1):
+        """col is the coloumn that the book names are stored in"""
+        self.col = col
+
+        # normalised name -> how many rows it is on
+        self.title_counts = {}
+
+        # the normalised names in order (for complete)
+        self.sorted_titles = []
+
+        # trigram -> set of the names that have it, and
+        # name length -> set of names (for suggest)
+        # these are only made the first time a name is misspelled
+        # as they take a while to make and use a lot of memory
+        self.trigram_titles = None
+        self.length_titles = None
+
+    def cell(self, values):
+        if (len(values) >= self.col):
+            return values[self.col - 1]
+
+        return ''
+
+    def add(self, title):
+        title = normalise(title)
+
+        if (title == ''):
+            return
+
+        self.title_counts[title] = self.title_counts.get(title, 0) + 1
+
+        if (self.title_counts[title] > 1):
+            return
+
+        bisect.insort(self.sorted_titles, title)
+
+        if (self.trigram_titles is not None):
+            self.add_trigrams(title)
+
+    def remove(self, title):
+        title = normalise(title)
+
+        if (title not in self.title_counts):
+            return
+
+        self.title_counts[title] -= 1
+
+        if (self.title_counts[title] > 0):
+            return
+
+        del self.title_counts[title]
+
+        position = bisect.bisect_left(self.sorted_titles, title)
+        self.sorted_titles.pop(position)
+
+        if (self.trigram_titles is None):
+            return
+
+        for trigram in trigrams(title):
+            self.trigram_titles[trigram].discard(title)
+
+            if (self.trigram_titles[trigram] == set()):
+                del self.trigram_titles[trigram]
+
+        self.length_titles[len(title)].discard(title)
+
+    def add_trigrams(self, title):
+        for trigram in trigrams(title):
+            self.trigram_titles.setdefault(trigram, set()).add(title)
+
+        self.length_titles.setdefault(len(title), set()).add(title)
+
+    def load(self, rows):
+        """This function builds the index from all the rows of a worksheet
+        (a catalog, see catalog.py)"""
+        self.title_counts = {}
+        self.trigram_titles = None
+        self.length_titles = None
+
+        for title in rows.column(self.col):
+            title = normalise(title)
+
+            if (title != ''):
+                self.title_counts[title] = self.title_counts.get(title, 0) + 1
+
+        self.sorted_titles = sorted(self.title_counts)
+
+    def row_changed(self, row, old_values, new_values):
+        """This function is called by the cache when a row has changed"""
+        old_title = self.cell(old_values)
+        new_title = self.cell(new_values)
+
+        if (normalise(old_title) != normalise(new_title)):
+            self.remove(old_title)
+            self.add(new_title)
+
+    def complete(self, prefix, limit=SUGGESTION_LIMIT):
+        """This function returns the names that start with prefix
+        (in alphabetical order)"""
+        prefix = normalise(prefix)
+        position = bisect.bisect_left(self.sorted_titles, prefix)
+
+        titles = []
+
+        while (position < len(self.sorted_titles) and len(titles) < limit and
+               self.sorted_titles[position].startswith(prefix)):
+            titles.append(self.sorted_titles[position])
+            position += 1
+
+        return titles
+
+    def candidates(self, title, max_distance):
+        """This function finds the names that could be close to title,
+        a name within max_distance of it has all but
+        3 * max_distance of its trigrams
+        (each letter changed breaks up to 3 of them)"""
+        if (self.trigram_titles is None):
+            self.trigram_titles = {}
+            self.length_titles = {}
+
+            for known_title in self.sorted_titles:
+                self.add_trigrams(known_title)
+
+        title_trigrams = trigrams(title)
+        needed = len(title_trigrams) - 3 * max_distance
+
+        # names this short could share no trigrams at all,
+        # so every name about the same length is checked
+        if (needed <= 0):
+            candidates = set()
+
+            for length in range(len(title) - max_distance,
+                                len(title) + max_distance + 1):
+                candidates.update(self.length_titles.get(length, ()))
+
+            return candidates
+
+        # a close name must have at least one of any 3 * max_distance + 1
+        # of the trigrams, so only the names with the rarest ones are
+        # looked at (common ones like 'the' are in too many names)
+        rarest = sorted(title_trigrams, key=lambda trigram: len(
+            self.trigram_titles.get(trigram, ())))[:3 * max_distance + 1]
+
+        candidates = set()
+        for trigram in rarest:
+            candidates.update(self.trigram_titles.get(trigram, ()))
+
+        return [candidate for candidate in candidates
+                if abs(len(candidate) - len(title)) <= max_distance and
+                len(title_trigrams & trigrams(candidate)) >= needed]
+
+    def suggest(self, title, max_distance=MAX_DISTANCE,
+                limit=SUGGESTION_LIMIT):
+        """This function returns the names closest to title as a list of
+        (distance, name), closest first (an exact match has distance 0)"""
+        title = normalise(title)
+
+        if (title in self.title_counts):
+            return [(0, title)]
+
+        matches = []
+
+        for candidate in self.candidates(title, max_distance):
+            distance = edit_distance(title, candidate, max_distance)
+
+            if (distance <= max_distance):
+                matches.append((distance, candidate))
+
+        matches.sort()
+
+        return matches[:limit]
+
+
+def enable_completion(indexes):
+    """This function turns on tab completion of book names when typing
+    (readline is not on every computer, so nothing happens without it)"""
+    # only imported here as it changes how input works
+    try:
+        import readline
+    except ImportError:
+        return
+
+    readline.set_completer(title_completer(indexes))
+    # book names have spaces in them, so the whole line is completed
+    readline.set_completer_delims('')
+    readline.parse_and_bind('tab: complete')
+
+
+def title_completer(indexes):
+    """This function makes a tab completion function for readline
+    that completes book names from the indexes"""
+    matches = []
+
+    def complete(text, state):
+        # readline asks for each match in turn, starting at 0
+        if (state == 0):
+            matches[:] = sorted({title for index in indexes
+                                 for title in index.complete(text)})
+
+        if (state < len(matches)):
+            return matches[state]
+
+        return None
+
+    return complete
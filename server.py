@@ -0,0 +1,459 @@
+"""
+Filename: server.py
+Description: This file runs the library manager as a service on this
+    computer, so every desk can use one library manager instead of each
+    running its own (each with its own login, its own copy of the
+    worksheets and its own share of google's quota).
+
+    Requests and answers are json:
+
+        GET  /available                 the books that can be loaned
+        GET  /loaned                    the books that are loaned
+        GET  /due?days=20               the books due in the next days
+        GET  /overdue                   the books that are overdue
+        GET  /student?name=...          the books a student has
+        POST /add     {"name": ..., "fiction": "f" / "nf"}
+        POST /loan    {"name": ..., "student": ...}
+        POST /return  {"name": ...}
+        POST /returnall {"student": ...}  (every book the student has)
+
+    Each request is answered by one of a pool of threads. The books are
+    read straight from the local copy of the worksheets, but adding,
+    loaning and returning books is passed to one writer thread (one
+    change at a time). The writer runs the changes that are waiting
+    together the same way scripts do (see library_changes.py), so 10
+    desks loaning books at the same time only move books and get rid of
+    gaps once.
+
+    python server.py [--port 8080] [--sqlite library.db]
+"""
+
+import argparse
+import json
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+# other files
+from book_index import normalise
+from instrumentation import operation
+from library_changes import CHANGE_COMMANDS
+from scheduler import request_failed
+from snapshot import SNAPSHOT_FILE
+from storage import sheets_backend, sqlite_backend
+from v3 import library_manager, finish_writes
+from valid_input import valid_book, valid_name
+
+# the port the service listens on (only on this computer by default)
+SERVER_PORT = 8080
+
+# how many requests are answered at the same time
+SERVER_WORKERS = 8
+
+# the most changes the writer runs together
+WRITE_BATCH = 100
+
+# how often the writer gets other clerks' changes when it has
+# nothing else to do (seconds)
+SYNC_TIME = 30
+
+# the biggest request body that is read (bytes)
+MAX_BODY = 64 * 1024
+
+
+class write_job():
+    """A change waiting for the writer, the answer (status, json)
+    is put in result once it has been made"""
+
+    def __init__(self, command, book):
+        self.command = command
+        self.book = book
+        self.result = Future()
+
+    def answer(self, status, body):
+        self.result.set_result((status, body))
+
+
+def read_book(command, body):
+    """This function checks the json sent for a change
+    and returns the book (or an error message)"""
+    if (not isinstance(body, dict)):
+        return None, 'send a json object'
+
+    fields = {'add': ['name', 'fiction'],
+              'loan': ['name', 'student'],
+              'return': ['name'],
+              'returnall': ['student']}[command]
+
+    book = {}
+    for field in fields:
+        value = body.get(field)
+
+        if (not isinstance(value, str) or not valid_name(normalise(value))):
+            return None, '{} needs a valid {}'.format(command, field)
+
+        book[field] = normalise(value)
+
+    if (command == 'add' and valid_book(book['name'],
+                                        book['fiction']) is None):
+        return None, 'fiction has to be f, nf, fiction or non fiction'
+
+    return book, None
+
+
+def days_left(due_time, now):
+    """This function gets the days until a book is due
+    (None if its due time cell is empty or not a number)"""
+    if (due_time is None):
+        return None
+
+    #                       (seconds to days)
+    return round((due_time - now) / 86400, 2)
+
+
+class library_service():
+    """One library manager shared by every request
+
+    Reads use the local copy, changes are made one group at a time by
+    the writer thread. A read only waits for the worksheet it reads while
+    a row is being changed in the local copy (see worksheet_cache.reading),
+    not while the writer is waiting for google sheets"""
+
+    def __init__(self, manager, sync_time=SYNC_TIME):
+        self.manager = manager
+        self.sync_time = sync_time
+
+        self.write_queue = queue.Queue()
+
+        self.writer = threading.Thread(target=self.run_writes,
+                                       name='library_writer', daemon=True)
+        self.writer.start()
+
+    # --- changes (one at a time, in the writer thread) ---
+
+    def write(self, command, book):
+        """This function passes a change to the writer
+        and waits for its answer"""
+        job = write_job(command, book)
+        self.write_queue.put(job)
+
+        return job.result.result()
+
+    def stop(self):
+        """This function lets the writer finish the changes
+        that are waiting then stops it"""
+        self.write_queue.put(None)
+        self.writer.join()
+
+    def run_writes(self):
+        while True:
+            try:
+                jobs = [self.write_queue.get(timeout=self.sync_time)]
+
+            # keeps the local copy up to date while nothing is happening
+            except queue.Empty:
+                self.run_group('sync', [])
+                continue
+
+            # the changes that are waiting are run together
+            while len(jobs) < WRITE_BATCH:
+                try:
+                    jobs.append(self.write_queue.get_nowait())
+
+                except queue.Empty:
+                    break
+
+            stopping = None in jobs
+            jobs = [job for job in jobs if job is not None]
+
+            # the same changes one after another are run as one group
+            group = []
+            for job in jobs:
+                if (group != [] and group[0].command != job.command):
+                    self.run_group(group[0].command, group)
+                    group = []
+
+                group.append(job)
+
+            if (group != []):
+                self.run_group(group[0].command, group)
+
+            if (stopping):
+                return
+
+    def run_group(self, command, jobs):
+        """This function makes a group of the same change"""
+        try:
+            with operation('server {}'.format(command)):
+                # gets what the other clerks have changed first
+                self.manager.sync()
+
+                # the reads do not download the worksheets again,
+                # so it is done here when they are too old
+                for worksheet in self.manager.shards.worksheets():
+                    worksheet.check_expired()
+
+                if (jobs != []):
+                    answers = CHANGE_COMMANDS[command](
+                        self.manager, [job.book for job in jobs])
+
+                    for job, (status, body) in zip(jobs, answers):
+                        job.answer(status, body)
+
+        except request_failed:
+            self.fail(jobs, 503, 'google sheets is too busy right now, '
+                                 'please try again in a minute')
+
+        except Exception as error:
+            self.fail(jobs, 500, 'the change could not be made ({})'.format(
+                type(error).__name__))
+
+    def fail(self, jobs, status, message):
+        for job in jobs:
+            if (not job.result.done()):
+                job.answer(status, {'error': message})
+
+    # --- reads (from the local copy, in the pool's threads) ---
+
+    def books(self, loaned):
+        """This function gets every available (or loaned) book"""
+        books = []
+
+        for shard in self.manager.shards:
+            with shard.books(loaned).reading() as rows:
+                for row in range(1, len(rows) + 1):
+                    values = rows.row_values(row)
+
+                    # gaps are left out
+                    if (values == [] or values[0] == ''):
+                        continue
+
+                    book = {'name': values[0],
+                            'fiction': values[1] if len(values) > 1 else ''}
+
+                    if (loaned):
+                        record = rows.record(row)
+                        book['student'] = record.student
+                        book['due'] = record.due_time
+
+                    books.append(book)
+
+        return books
+
+    def student_books(self, student_name):
+        """This function gets the books a student has loaned"""
+        now = time.time()
+
+        books = []
+
+        for shard in self.manager.shards:
+            # (the index changes with the rows)
+            with shard.loaned_books.reading() as rows:
+                for row in shard.students.find_all(student_name):
+                    record = rows.record(row)
+
+                    books.append({'name': record.title,
+                                  'due': record.due_time,
+                                  'days_left': days_left(record.due_time,
+                                                         now)})
+
+        # (the books without a due time go last)
+        books.sort(key=lambda book: (book['due'] is None, book['due'] or 0))
+
+        return books
+
+    def due_books(self, end=None):
+        """This function gets the loaned books due before end
+        (or that are overdue if end is None), soonest first"""
+        now = time.time()
+
+        if (end is None):
+            end = now
+
+        books = []
+
+        for shard in self.manager.shards:
+            # (the index changes with the rows)
+            with shard.loaned_books.reading() as rows:
+                for row in shard.due_dates.due_before(end):
+                    record = rows.record(row)
+
+                    books.append({'name': record.title,
+                                  'student': record.student,
+                                  'due': record.due_time,
+                                  'days_left': days_left(record.due_time,
+                                                         now)})
+
+        books.sort(key=lambda book: book['due'])
+
+        return books
+
+
+class request_handler(BaseHTTPRequestHandler):
+    """Answers one request (the service is server.service)"""
+
+    def send_json(self, status, body):
+        data = json.dumps(body).encode('utf-8')
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        service = self.server.service
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+
+        if (url.path == '/available'):
+            self.send_json(200, {'books': service.books(False)})
+
+        elif (url.path == '/loaned'):
+            self.send_json(200, {'books': service.books(True)})
+
+        elif (url.path == '/due'):
+            try:
+                days = float(query.get('days', ['20'])[0])
+
+            except ValueError:
+                self.send_json(400, {'error': 'days has to be a number'})
+                return
+
+            self.send_json(200, {'books': service.due_books(
+                time.time() + days * 24 * 60 * 60)})
+
+        elif (url.path == '/overdue'):
+            self.send_json(200, {'books': service.due_books()})
+
+        elif (url.path == '/student'):
+            student_name = query.get('name', [''])[0]
+
+            if (normalise(student_name) == ''):
+                self.send_json(400, {'error': 'student needs a name'})
+                return
+
+            self.send_json(200, {'books': service.student_books(
+                student_name)})
+
+        else:
+            self.send_json(404, {'error': 'unknown path {}'.format(url.path)})
+
+    def do_POST(self):
+        command = urlsplit(self.path).path.strip('/')
+
+        if (command not in CHANGE_COMMANDS):
+            self.send_json(404, {'error': 'unknown path {}'.format(
+                self.path)})
+            return
+
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+
+        except ValueError:
+            length = -1
+
+        if (length < 0 or length > MAX_BODY):
+            self.send_json(413, {'error': 'the request is too big'})
+            return
+
+        try:
+            body = json.loads(self.rfile.read(length) or b'null')
+
+        except ValueError:
+            self.send_json(400, {'error': 'the request is not json'})
+            return
+
+        book, error = read_book(command, body)
+        if (book is None):
+            self.send_json(400, {'error': error})
+            return
+
+        self.send_json(*self.server.service.write(command, book))
+
+    def log_message(self, format, *arguments):
+        # (the requests are written to stderr like http.server does)
+        sys.stderr.write('{} {}\n'.format(self.log_date_time_string(),
+                                          format % arguments))
+
+
+class library_server(HTTPServer):
+    """An HTTP server that answers requests with a pool of threads
+    (instead of a new thread for every request)"""
+
+    def __init__(self, address, service, workers=SERVER_WORKERS):
+        HTTPServer.__init__(self, address, request_handler)
+
+        self.service = service
+        self.pool = ThreadPoolExecutor(max_workers=workers,
+                                       thread_name_prefix='library_server')
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self.process_request_thread, request,
+                         client_address)
+
+    def process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+
+        except Exception:
+            self.handle_error(request, client_address)
+
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        HTTPServer.server_close(self)
+        self.pool.shutdown(wait=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Library manager service')
+    parser.add_argument('--host', default='127.0.0.1',
+                        help='the address to listen on (only this '
+                             'computer by default)')
+    parser.add_argument('--port', type=int, default=SERVER_PORT)
+    parser.add_argument('--workers', type=int, default=SERVER_WORKERS,
+                        help='how many requests are answered at once')
+    parser.add_argument('--sqlite', metavar='FILE',
+                        help='use a local database file instead of '
+                             'the google spreadsheet')
+    parser.add_argument('--key', metavar='KEY',
+                        help='open the spreadsheet by its key')
+    arguments = parser.parse_args()
+
+    with operation('startup'):
+        if (arguments.sqlite is not None):
+            manager = library_manager(sqlite_backend(arguments.sqlite))
+
+        else:
+            manager = library_manager(
+                sheets_backend(spreadsheet_key=arguments.key),
+                snapshot_file=SNAPSHOT_FILE)
+
+    service = library_service(manager)
+    server = library_server((arguments.host, arguments.port), service,
+                            arguments.workers)
+
+    print('The library is at http://{}:{}/ (ctrl + c to stop)'.format(
+        arguments.host, arguments.port))
+
+    try:
+        server.serve_forever()
+
+    except KeyboardInterrupt:
+        pass
+
+    finally:
+        server.server_close()
+
+        # the changes waiting are made and the stamps that are left sent
+        service.stop()
+        finish_writes(manager)
+
+
+if (__name__ == '__main__'):
+    main()
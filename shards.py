@@ -0,0 +1,297 @@
+"""
+Filename: shards.py
+Description: This file splits the library across more than one pair of
+    worksheets (shards), as one google worksheet only holds so many rows:
+
+        shard 1 - available    and loaned
+        shard 2 - available 2  and loaned 2
+        ...
+
+    The 'shards' worksheet (the directory) has a row for each shard with
+    the titles of its 2 worksheets. A book always goes in the shard picked
+    by a hash of its name, so finding, loaning and returning a book only
+    reads and writes the 2 small worksheets of its shard.
+
+    A library without a directory is one shard (available and loaned),
+    reshard moves every book to its shard when the number of shards
+    is changed (see --shards in v3.py).
+"""
+
+import zlib
+# other files
+from book_index import book_index, normalise
+from due_index import due_index
+from student_index import student_index
+from search_index import search_index, SUGGESTION_LIMIT
+from worksheet_cache import load_caches
+from catalog import DUE_COL
+
+# the worksheet that lists the shards
+SHARD_DIRECTORY = 'shards'
+
+# the worksheets of the first shard (the ones used before sharding)
+FIRST_SHARD = ('available', 'loaned')
+
+
+def shard_titles(number):
+    """This function gets the worksheet titles of a shard (starting at 0)"""
+    if (number == 0):
+        return FIRST_SHARD
+
+    return tuple('{} {}'.format(title, number + 1) for title in FIRST_SHARD)
+
+
+def shard_number(title, shard_count):
+    """This function picks the shard a book goes in from its name
+    (crc32 is used as python's hash of text changes every run)"""
+    return zlib.crc32(normalise(title).encode('utf-8')) % shard_count
+
+
+class library_shard():
+    """The available and loaned worksheets of one shard and their indexes"""
+
+    def __init__(self, number, available_books, loaned_books):
+        self.number = number
+        self.available_books = available_books
+        self.loaned_books = loaned_books
+
+        # book name -> row, kept up to date by the caches
+        self.available_books.add_index(book_index(1))
+        self.loaned_books.add_index(book_index(1))
+
+        # due time -> row, in order of due time
+        self.due_dates = due_index(4)
+        self.loaned_books.add_index(self.due_dates)
+
+        # student name -> rows of the books they have
+        self.students = student_index()
+        self.loaned_books.add_index(self.students)
+
+        # for finding books when the name is not typed exactly
+        self.available_search = search_index(1)
+        self.loaned_search = search_index(1)
+        self.available_books.add_index(self.available_search)
+        self.loaned_books.add_index(self.loaned_search)
+
+    def __repr__(self):
+        return '<library_shard {} {!r}>'.format(self.number,
+                                                self.available_books.title)
+
+    def books(self, loaned):
+        """This function gets the loaned or available worksheet"""
+        if (loaned):
+            return self.loaned_books
+
+        return self.available_books
+
+    def search(self, loaned):
+        if (loaned):
+            return self.loaned_search
+
+        return self.available_search
+
+
+class shard_set():
+    """Every shard of the library"""
+
+    def __init__(self, shards, directory=None):
+        """directory is the 'shards' worksheet (None if there is not one)"""
+        self.shards = shards
+        self.directory = directory
+
+    def __iter__(self):
+        return iter(self.shards)
+
+    def __len__(self):
+        return len(self.shards)
+
+    def shard_for(self, title):
+        """This function gets the shard a book is (or would be) in"""
+        return self.shards[shard_number(title, len(self.shards))]
+
+    def search_indexes(self):
+        return [shard.search(loaned) for shard in self.shards
+                for loaned in [False, True]]
+
+    def suggest(self, title, loaned, limit=SUGGESTION_LIMIT):
+        """This function gets the closest book names to title from every
+        shard (a misspelled name can hash to a different shard)"""
+        matches = []
+
+        for shard in self.shards:
+            matches += shard.search(loaned).suggest(title, limit=limit)
+
+        matches.sort()
+
+        return [match_title for _, match_title in matches[:limit]]
+
+    def student_rows(self, student_name):
+        """This function gets the (shard, row)s of every book loaned to
+        a student (a student's books can be in any shard)"""
+        return [(shard, row) for shard in self.shards
+                for row in shard.students.find_all(student_name)]
+
+    def worksheets(self):
+        """This function gets every worksheet cache (with the directory)"""
+        worksheets = [worksheet for shard in self.shards
+                      for worksheet in [shard.available_books,
+                                        shard.loaned_books]]
+
+        if (self.directory is not None):
+            worksheets.append(self.directory)
+
+        return worksheets
+
+    def flush(self):
+        for shard in self.shards:
+            shard.available_books.flush()
+            shard.loaned_books.flush()
+
+    def wait_reconciled(self):
+        """This function waits for every worksheet to be downloaded
+        if the library started from a snapshot (see snapshot.py)"""
+        for worksheet in self.worksheets():
+            worksheet.wait_reconciled()
+
+
+def read_directory(rows):
+    """This function gets the worksheet titles of each shard
+    from the rows of the directory ([available title, loaned title])"""
+    return [(row[0], row[1]) for row in rows if len(row) >= 2 and row[0] != '']
+
+
+def load_shards(backend, refresh_time=None, snapshot=None,
+                stamp_rows=False):
+    """This function downloads every shard and returns a shard_set
+
+    The first shard is downloaded with the directory so a library with
+    one shard still only needs one request
+    snapshot is the last saved copy of the worksheets (see snapshot.py)
+    stamp_rows is True to stamp the rows that are written
+    (see delta_sync.py)"""
+    titles = list(FIRST_SHARD)
+
+    has_directory = SHARD_DIRECTORY in backend.worksheet_titles()
+
+    # the saved worksheet titles can be from before another desk
+    # made the directory, so they are looked up again to make sure
+    # (otherwise the other shards would be missed)
+    if (not has_directory):
+        has_directory = (SHARD_DIRECTORY in
+                         backend.worksheet_titles(look_up=True))
+
+    if (has_directory):
+        titles.append(SHARD_DIRECTORY)
+
+    caches = dict(zip(titles, load_caches(backend, titles, refresh_time,
+                                          snapshot, stamp_rows)))
+
+    directory = caches.pop(SHARD_DIRECTORY, None)
+
+    shard_list = [FIRST_SHARD]
+    if (directory is not None):
+        shard_list = read_directory(directory.get_all_values()) or shard_list
+
+    # the other shards are downloaded together
+    missing = [title for titles in shard_list for title in titles
+               if title not in caches]
+
+    if (missing != []):
+        caches.update(zip(missing, load_caches(backend, missing, refresh_time,
+                                               snapshot, stamp_rows)))
+
+    return shard_set([library_shard(number, caches[available], caches[loaned])
+                      for number, (available, loaned)
+                      in enumerate(shard_list)], directory)
+
+
+def book_rows(worksheet):
+    """This function gets every book in a worksheet as rows to write,
+    with the due times as numbers (like move_book writes them)"""
+    rows = []
+
+    for row in range(1, len(worksheet.get_catalog()) + 1):
+        values = worksheet.row_values(row)
+
+        # gaps are left behind
+        if (values == [] or values[0] == ''):
+            continue
+
+        due_time = worksheet.record(row).due_time
+        if (len(values) >= DUE_COL and due_time is not None and
+                due_time.is_integer()):
+            values[DUE_COL - 1] = int(due_time)
+
+        rows.append(values)
+
+    return rows
+
+
+def reshard(backend, shards, shard_count, refresh_time=None,
+            stamp_rows=False):
+    """This function moves every book to the shard it goes in when there
+    are shard_count shards (load_shards has to be used afterwards)
+
+    The worksheets of shards that are not used any more are emptied but
+    not deleted. Nobody else should be using the library while this runs,
+    as books are in the wrong shard until it finishes."""
+    shard_list = [shard_titles(number) for number in range(shard_count)]
+
+    # makes the worksheets that are not there yet (in one request)
+    existing = backend.worksheet_titles(look_up=True)
+    new_titles = [title for titles in shard_list for title in titles
+                  if title not in existing]
+
+    if (SHARD_DIRECTORY not in existing):
+        new_titles.append(SHARD_DIRECTORY)
+
+    if (new_titles != []):
+        backend.add_worksheets(new_titles)
+
+    # every book in the library, sorted into its new shard
+    available_rows = [[] for _ in range(shard_count)]
+    loaned_rows = [[] for _ in range(shard_count)]
+
+    for shard in shards:
+        for values in book_rows(shard.available_books):
+            available_rows[shard_number(values[0], shard_count)].append(values)
+
+        for values in book_rows(shard.loaned_books):
+            loaned_rows[shard_number(values[0], shard_count)].append(values)
+
+    caches = {}
+    for shard in shards:
+        caches[shard.available_books.title] = shard.available_books
+        caches[shard.loaned_books.title] = shard.loaned_books
+
+    missing = [title for titles in shard_list for title in titles
+               if title not in caches]
+
+    if (missing != []):
+        caches.update(zip(missing, load_caches(backend, missing, refresh_time,
+                                               stamp_rows=stamp_rows)))
+
+    # rewrites every worksheet (the old shards are emptied)
+    new_rows = {}
+    for number in range(shard_count):
+        new_rows[shard_list[number][0]] = available_rows[number]
+        new_rows[shard_list[number][1]] = loaned_rows[number]
+
+    for title, worksheet in caches.items():
+        worksheet.clear()
+
+        if (new_rows.get(title, []) != []):
+            worksheet.update('A1', new_rows[title])
+
+        worksheet.flush()
+
+    # the directory is written last, so until then
+    # the library is still read the old way
+    directory = shards.directory
+    if (directory is None):
+        directory = load_caches(backend, [SHARD_DIRECTORY], refresh_time,
+                                stamp_rows=stamp_rows)[0]
+
+    directory.clear()
+    directory.update('A1', [list(titles) for titles in shard_list])
+    directory.flush()
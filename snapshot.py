@@ -0,0 +1,273 @@
+"""
+Filename: snapshot.py
+Description: This file saves a copy of the worksheets to a file when the
+    program ends, so the next run can show the books straight away
+    instead of waiting to download them.
+
+    The file is laid out by coloumn like catalog.py, so it can be
+    memory mapped and each coloumn read in one go instead of being
+    parsed a value at a time:
+
+        header         - SNAPSHOT_MAGIC, the version, the byte order,
+                         when it was saved and which spreadsheet it is of
+        contents       - for each worksheet its title, number of rows
+                         and where each of its sections are
+        sections       - genres (1 byte each), due times (8 byte floats),
+                         title and student offset tables (4 bytes each,
+                         where each name starts and ends in the text)
+                         then the text, and the other cells (json)
+
+    The snapshot can be out of date, so the worksheets are still
+    downloaded (in the background) and replace it if they are different
+    (see worksheet_cache.reconcile).
+"""
+
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+# other file
+from catalog import catalog
+
+# where the snapshot is saved
+SNAPSHOT_FILE = '.library_snapshot'
+
+# the start of every snapshot file
+SNAPSHOT_MAGIC = b'LIBSNAP\0'
+
+# changed whenever the layout of the file changes,
+# snapshots with a different version are not used
+SNAPSHOT_VERSION = 1
+
+# magic, version, byte order, saved time, worksheet count, source length
+HEADER_FORMAT = '<8sHcdII'
+
+# title length, row count and (offset, length) of each section
+CONTENTS_FORMAT = '<II14Q'
+
+# the sections of each worksheet, in order
+SECTIONS = ['genres', 'due_times', 'title_offsets', 'titles',
+            'student_offsets', 'students', 'other_cells']
+
+
+def snapshot_source(backend):
+    """This function gets the name of the spreadsheet a backend uses,
+    so a snapshot of a different one is not used"""
+    if (hasattr(backend, 'spreadsheet_name')):
+        return 'sheets:{}:{}'.format(backend.spreadsheet_name,
+                                     backend.spreadsheet_key or '')
+
+    return type(backend).__name__
+
+
+def pack_text(values):
+    """This function packs a list of text into an offset table and the
+    text (value number n is text[offsets[n]:offsets[n + 1]])"""
+    encoded = [value.encode('utf-8') for value in values]
+
+    offsets = array('I', [0])
+    position = 0
+    for value in encoded:
+        position += len(value)
+        offsets.append(position)
+
+    return offsets.tobytes(), b''.join(encoded)
+
+
+def unpack_text(offsets, text):
+    """This function turns an offset table and text back into a list"""
+    offsets = offsets.tolist()
+    decoded = text.decode('utf-8')
+
+    # letters that take more than one byte move the offsets along,
+    # so each value is decoded on its own
+    if (len(decoded) != len(text)):
+        return [sys.intern(text[start:end].decode('utf-8'))
+                for start, end in zip(offsets, offsets[1:])]
+
+    # otherwise the offsets are the same in the decoded text
+    return [sys.intern(decoded[start:end])
+            for start, end in zip(offsets, offsets[1:])]
+
+
+def catalog_sections(rows):
+    """This function gets the sections of a catalog as bytes"""
+    title_offsets, titles = pack_text(rows.titles)
+    student_offsets, students = pack_text(rows.students)
+
+    # json keys have to be text
+    other_cells = {str(row): {str(col): text for col, text in cells.items()}
+                   for row, cells in rows.other_cells.items()}
+
+    return [rows.genres.tobytes(), rows.due_times.tobytes(),
+            title_offsets, titles, student_offsets, students,
+            json.dumps(other_cells).encode('utf-8')]
+
+
+def padding(size):
+    """This function gets the bytes needed to line size up to 8 bytes
+    (so the floats can be read straight out of the mapped file)"""
+    return b'\0' * (-size % 8)
+
+
+def write_snapshot(filename, source, worksheets):
+    """This function saves the catalogs in worksheets (title -> catalog)
+
+    It is written to another file first then moved over the old one,
+    so a snapshot is never left half written"""
+    source_bytes = source.encode('utf-8')
+    header = struct.pack(HEADER_FORMAT, SNAPSHOT_MAGIC, SNAPSHOT_VERSION,
+                         sys.byteorder[0].encode('ascii'), time.time(),
+                         len(worksheets), len(source_bytes)) + source_bytes
+    header += padding(len(header))
+
+    titles = [title.encode('utf-8') for title in worksheets]
+
+    contents_size = sum([struct.calcsize(CONTENTS_FORMAT) + len(title) +
+                         len(padding(struct.calcsize(CONTENTS_FORMAT) +
+                                     len(title)))
+                         for title in titles])
+
+    contents = b''
+    sections = []
+    position = len(header) + contents_size
+
+    for title, rows in zip(titles, worksheets.values()):
+        places = []
+
+        for section in catalog_sections(rows):
+            places += [position, len(section)]
+
+            section += padding(len(section))
+            sections.append(section)
+            position += len(section)
+
+        entry = struct.pack(CONTENTS_FORMAT, len(title), len(rows),
+                            *places) + title
+        contents += entry + padding(len(entry))
+
+    temporary_file = filename + '.tmp'
+
+    # the snapshot has the students' names in it
+    file_descriptor = os.open(temporary_file,
+                              os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+
+    with os.fdopen(file_descriptor, 'wb') as snapshot_file:
+        snapshot_file.write(header)
+        snapshot_file.write(contents)
+
+        for section in sections:
+            snapshot_file.write(section)
+
+    os.replace(temporary_file, filename)
+
+
+def read_snapshot(filename, source):
+    """This function reads a snapshot into a dict of title -> catalog
+    (None if there is not one, or it is of a different spreadsheet,
+    version or computer)"""
+    try:
+        snapshot_file = open(filename, 'rb')
+
+    except OSError:
+        return None
+
+    with snapshot_file:
+        try:
+            mapped = mmap.mmap(snapshot_file.fileno(), 0,
+                               access=mmap.ACCESS_READ)
+
+        # an empty file can not be mapped
+        except ValueError:
+            return None
+
+    data = memoryview(mapped)
+
+    try:
+        return read_worksheets(data, source)
+
+    # a snapshot that was cut short or changed by something else
+    except (struct.error, ValueError, UnicodeDecodeError, IndexError):
+        return None
+
+    finally:
+        data.release()
+
+        try:
+            mapped.close()
+
+        # a part of it is still being looked at,
+        # it is closed when that is finished with
+        except BufferError:
+            pass
+
+
+def read_worksheets(data, source):
+    """This function reads every worksheet out of a mapped snapshot"""
+    magic, version, byte_order, _, worksheet_count, source_length = (
+        struct.unpack_from(HEADER_FORMAT, data))
+
+    position = struct.calcsize(HEADER_FORMAT)
+    saved_source = bytes(data[position:position + source_length])
+
+    if (magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION or
+            byte_order != sys.byteorder[0].encode('ascii') or
+            saved_source != source.encode('utf-8')):
+        return None
+
+    position += source_length
+    position += -position % 8
+
+    worksheets = {}
+
+    for _ in range(worksheet_count):
+        entry = struct.unpack_from(CONTENTS_FORMAT, data, position)
+        title_length, row_count, places = entry[0], entry[1], entry[2:]
+
+        position += struct.calcsize(CONTENTS_FORMAT)
+        title = bytes(data[position:position + title_length]).decode('utf-8')
+        position += title_length
+        position += -position % 8
+
+        # a file that was cut short
+        if (max([places[index * 2] + places[index * 2 + 1]
+                 for index in range(len(SECTIONS))]) > len(data)):
+            return None
+
+        # each section is a view of the mapped file (nothing is copied yet)
+        sections = dict((SECTIONS[index],
+                         data[places[index * 2]:
+                              places[index * 2] + places[index * 2 + 1]])
+                        for index in range(len(SECTIONS)))
+
+        genres = array('b')
+        genres.frombytes(sections['genres'])
+
+        due_times = array('d')
+        due_times.frombytes(sections['due_times'])
+
+        titles = unpack_text(sections['title_offsets'].cast('I'),
+                             bytes(sections['titles']))
+        students = unpack_text(sections['student_offsets'].cast('I'),
+                               bytes(sections['students']))
+
+        other_cells = {int(row): {int(col): text
+                                  for col, text in cells.items()}
+                       for row, cells in json.loads(
+                           bytes(sections['other_cells'])).items()}
+
+        if (not (len(titles) == len(students) == len(genres) ==
+                 len(due_times) == row_count)):
+            return None
+
+        worksheets[title] = catalog.from_columns(titles, genres, students,
+                                                 due_times, other_cells)
+
+        # the views have to be let go of before the file is closed
+        for section in sections.values():
+            section.release()
+
+    return worksheets
@@ -0,0 +1,790 @@
+"""
+Filename: storage.py
+Description: This file has the different places that the library
+    can be stored (backends).
+
+    Every backend gives out worksheets that have the functions the
+    library manager uses (col_values, row_values, get, range, update,
+    update_cells, clear ...) so the rest of the program does not need
+    to know where the books are kept:
+        sheets_backend - the google spreadsheet (needs the internet),
+                         it saves its login and where the worksheets
+                         are between runs
+        sqlite_backend - a local database file, with indexes on the
+                         book name and due date coloumns
+
+    It also has the functions for working with A1 ranges ('A1:B2')
+    that the worksheets and the cache use.
+"""
+
+import datetime
+import importlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+# gspread is only needed for the google sheets backend,
+# it is imported when it is first used (see load_gspread)
+gspread = None
+
+
+def load_gspread():
+    """This function imports gspread the first time it is needed
+    (it takes a while to load, so the sqlite backend starts faster)"""
+    global gspread
+
+    if (gspread is None):
+        try:
+            gspread = importlib.import_module('gspread')
+
+        except ImportError:
+            raise ImportError('gspread is needed to use google sheets '
+                              '(pip install -r requirements.txt)') from None
+
+    return gspread
+
+
+# matches the column letters and row number of one side of an A1 range
+A1_PATTERN = re.compile(r'^([A-Za-z]*)(\d*)$')
+
+
+def letter_to_col(letters):
+    """This function turns coloumn letters ('A', 'AB') into a number"""
+    col = 0
+
+    for letter in letters.upper():
+        col = col * 26 + ord(letter) - ord('A') + 1
+
+    return col
+
+
+def col_to_letter(col):
+    """This function turns a coloumn number into letters"""
+    letters = ''
+
+    while col > 0:
+        col, remainder = divmod(col - 1, 26)
+        letters = chr(ord('A') + remainder) + letters
+
+    return letters
+
+
+def parse_range(range_name):
+    """This function turns an A1 range ('A1', 'A1:B2', 'A:A', 'A1:Z')
+    into (first_row, first_col, last_row, last_col)
+    None is used when a side has no limit"""
+    # gets rid of the worksheet name ('available!A1:B2')
+    range_name = range_name.split('!')[-1]
+
+    start, _, end = range_name.partition(':')
+
+    start_letters, start_row = A1_PATTERN.match(start).groups()
+
+    # a single cell ('A1') is its own end
+    if (end == ''):
+        end = start
+
+    end_letters, end_row = A1_PATTERN.match(end).groups()
+
+    first_row = int(start_row) if start_row else 1
+    first_col = letter_to_col(start_letters) if start_letters else 1
+    last_row = int(end_row) if end_row else None
+    last_col = letter_to_col(end_letters) if end_letters else None
+
+    return first_row, first_col, last_row, last_col
+
+
+def cell_text(value):
+    """This function turns a value into the text the sheet would show"""
+    if (value is None):
+        return ''
+
+    # the sheet shows whole numbers without the '.0'
+    # (loan time stamps are written as rounded floats)
+    if (isinstance(value, float) and value.is_integer()):
+        return str(int(value))
+
+    return str(value)
+
+
+def trim_row(row):
+    """This function gets rid of the empty cells at the end of a row"""
+    end = len(row)
+
+    while end > 0 and row[end - 1] == '':
+        end -= 1
+
+    return row[:end]
+
+
+def appended_row(response):
+    """This function gets the first row that append_rows wrote to
+    from what it sent back (None if it does not say)"""
+    if (not isinstance(response, dict)):
+        return None
+
+    updated_range = response.get('updates', {}).get('updatedRange')
+    if (updated_range is None):
+        return None
+
+    return parse_range(updated_range)[0]
+
+
+class cell():
+    """A single cell, works the same as gspread's Cell
+    so it can be changed and passed back into update_cells"""
+
+    def __init__(self, row, col, value=''):
+        self.row = row
+        self.col = col
+        self.value = value
+
+    def __repr__(self):
+        return '<cell R{}C{} {!r}>'.format(self.row, self.col, self.value)
+
+
+# the worksheet functions that read from the sheet
+READ_FUNCTIONS = ['get_all_values', 'col_values', 'row_values',
+                  'get', 'batch_get', 'range']
+
+# the worksheet functions that write to the sheet
+WRITE_FUNCTIONS = ['update', 'batch_update', 'update_cells',
+                   'append_rows', 'batch_clear', 'clear',
+                   'delete_row_ranges']
+
+
+class storage_backend():
+    """These are the functions every backend has"""
+
+    def open_worksheets(self, titles):
+        """This function returns a worksheet for each title"""
+        raise NotImplementedError
+
+    def batch_get_values(self, worksheets):
+        """This function returns all the rows of each worksheet
+        (in as few requests as the backend can)"""
+        return [worksheet.get_all_values() for worksheet in worksheets]
+
+    def batch_get_ranges(self, ranges):
+        """This function returns the values in each (worksheet, range)
+        (in as few requests as the backend can)"""
+        return [worksheet.get(range_name) for worksheet, range_name in ranges]
+
+    def change_version(self):
+        """This function returns something that changes every time
+        the worksheets are changed (see delta_sync.py)"""
+        raise NotImplementedError
+
+    def worksheet_titles(self, look_up=False):
+        """This function returns the title of every worksheet
+        look_up is True to ask for them again instead of using
+        saved ones (only the google sheets backend saves them)"""
+        raise NotImplementedError
+
+    def add_worksheets(self, titles):
+        """This function makes a new empty worksheet for each title"""
+        raise NotImplementedError
+
+
+# where the connection details are saved between runs
+# (the login token and where the worksheets are)
+SHEETS_CACHE_FILE = '.sheets_cache.json'
+
+# how long the saved worksheet details are trusted (seconds)
+SHEETS_CACHE_TIME = 24 * 60 * 60
+
+# a saved login token is not used if it runs out sooner than this (seconds)
+TOKEN_MARGIN = 5 * 60
+
+# the size of the worksheets that are added (the same as google's default)
+NEW_WORKSHEET_ROWS = 1000
+NEW_WORKSHEET_COLS = 26
+
+
+def read_sheets_cache(filename):
+    """This function reads the saved connection details
+    (an empty dict is used if there are none or they are broken)"""
+    try:
+        with open(filename) as cache_file:
+            saved = json.load(cache_file)
+
+    except (OSError, ValueError):
+        return {}
+
+    if (not isinstance(saved, dict)):
+        return {}
+
+    return saved
+
+
+def write_sheets_cache(filename, saved):
+    """This function saves the connection details,
+    only the user can read the file as it has the login token"""
+    try:
+        descriptor = os.open(filename, os.O_WRONLY | os.O_CREAT | os.O_TRUNC,
+                             0o600)
+
+        with os.fdopen(descriptor, 'w') as cache_file:
+            json.dump(saved, cache_file)
+
+    # the program still works without the cache, it just starts slower
+    except OSError:
+        pass
+
+
+def open_spreadsheet(client, properties):
+    """This function makes a gspread Spreadsheet from properties that are
+    already known (gspread's own asks google for them every time)"""
+    spreadsheet = gspread.Spreadsheet.__new__(gspread.Spreadsheet)
+    spreadsheet.client = client
+    spreadsheet._properties = properties
+
+    return spreadsheet
+
+
+class sheets_backend(storage_backend):
+    """The library stored in a google spreadsheet
+
+    The login token and where the worksheets are, are saved in
+    cache_file so the next run can skip logging in and looking them up
+    (gspread is imported and the saved details are read on the first
+    request, which is when the library manager downloads the worksheets)"""
+
+    def __init__(self, config_file='config.json',
+                 spreadsheet_name='library database', spreadsheet_key=None,
+                 cache_file=SHEETS_CACHE_FILE):
+        self.config_file = config_file
+        self.spreadsheet_name = spreadsheet_name
+        self.spreadsheet_key = spreadsheet_key
+        self.cache_file = cache_file
+
+        # these are made by connect the first time they are needed
+        self.client = None
+        self.spreadsheet = None
+
+        # worksheet title -> its properties (id, title, size ...)
+        self.worksheet_properties = {}
+
+        # if the worksheet details were looked up this run (not saved ones)
+        self.looked_up = False
+
+        self.lock = threading.Lock()
+
+    def connect(self, look_up=False):
+        """This function logs in and finds the spreadsheet and its
+        worksheets (only the first time it is called)
+        look_up is True to ignore the saved worksheet details"""
+        with self.lock:
+            if (self.spreadsheet is not None and not look_up):
+                return self.spreadsheet
+
+            load_gspread()
+
+            saved = read_sheets_cache(self.cache_file)
+
+            # connects to the service account
+            credentials = (gspread.auth.ServiceAccountCredentials
+                           .from_service_account_file(
+                               self.config_file,
+                               scopes=gspread.auth.DEFAULT_SCOPES))
+
+            # uses the saved token if it is for this account
+            # and has not run out, instead of logging in again
+            if (saved.get('client_email') == credentials.service_account_email
+                    and saved.get('token_expiry', 0) >
+                    time.time() + TOKEN_MARGIN):
+                credentials.token = saved['token']
+                # (google-auth keeps the expiry in utc without a timezone)
+                credentials.expiry = (datetime.datetime(1970, 1, 1) +
+                                      datetime.timedelta(
+                                          seconds=saved['token_expiry']))
+
+            else:
+                credentials.refresh(importlib.import_module(
+                    'google.auth.transport.requests').Request())
+
+                saved = {'client_email': credentials.service_account_email,
+                         'token': credentials.token,
+                         'token_expiry': (credentials.expiry -
+                                          datetime.datetime(1970, 1, 1))
+                                         .total_seconds(),
+                         'spreadsheets': saved.get('spreadsheets', {})}
+
+            self.client = gspread.Client(auth=credentials)
+
+            spreadsheets = saved.setdefault('spreadsheets', {})
+            details = spreadsheets.get(self.spreadsheet_name, {})
+            saved_key = details.get('key')
+
+            # the saved details are only used if they are recent
+            # and for the same spreadsheet
+            if (look_up or
+                    details.get('saved_time', 0) + SHEETS_CACHE_TIME <
+                    time.time() or (self.spreadsheet_key is not None and
+                        details.get('key') != self.spreadsheet_key)):
+                details = {}
+
+            if (details == {}):
+                key = self.spreadsheet_key
+
+                # the spreadsheet is the same when only its worksheets
+                # are looked up again, so drive is not searched again
+                if (key is None and look_up):
+                    key = saved_key
+
+                # searches google drive for the spreadsheet by its name
+                if (key is None):
+                    files = self.client.list_spreadsheet_files(
+                        self.spreadsheet_name)
+
+                    if (files == []):
+                        raise gspread.SpreadsheetNotFound(
+                            self.spreadsheet_name)
+
+                    key = files[0]['id']
+
+                # gets the spreadsheet and all of its worksheets
+                # in one request
+                metadata = open_spreadsheet(
+                    self.client, {'id': key}).fetch_sheet_metadata()
+
+                details = {'key': key,
+                           'saved_time': time.time(),
+                           'properties': metadata['properties'],
+                           'worksheets': [sheet['properties'] for sheet
+                                          in metadata['sheets']]}
+
+                spreadsheets[self.spreadsheet_name] = details
+                self.looked_up = True
+
+            write_sheets_cache(self.cache_file, saved)
+
+            self.spreadsheet = open_spreadsheet(
+                self.client, dict(details['properties'], id=details['key']))
+
+            self.worksheet_properties = {
+                properties['title']: properties
+                for properties in details['worksheets']}
+
+            return self.spreadsheet
+
+    def open_worksheets(self, titles):
+        spreadsheet = self.connect()
+
+        # a worksheet could have been added or renamed
+        # since the details were saved
+        if (not self.looked_up and
+                any([title not in self.worksheet_properties
+                     for title in titles])):
+            spreadsheet = self.connect(look_up=True)
+
+        # the worksheets were already found when connecting
+        worksheets = []
+
+        for title in titles:
+            if (title not in self.worksheet_properties):
+                raise gspread.WorksheetNotFound(title)
+
+            worksheets.append(sheets_worksheet(gspread.Worksheet(
+                spreadsheet, self.worksheet_properties[title])))
+
+        return worksheets
+
+    def batch_get_values(self, worksheets):
+        # every worksheet is downloaded in one request
+        # (titles are quoted as they can have spaces in them)
+        response = self.connect().values_batch_get(
+            ["'{}'".format(worksheet.title.replace("'", "''"))
+             for worksheet in worksheets])
+
+        return [value_range.get('values', [])
+                for value_range in response['valueRanges']]
+
+    def batch_get_ranges(self, ranges):
+        # every range is downloaded in one request
+        # (titles are quoted as they can have spaces in them)
+        response = self.connect().values_batch_get(
+            ["'{}'!{}".format(worksheet.title.replace("'", "''"), range_name)
+             for worksheet, range_name in ranges])
+
+        return [value_range.get('values', [])
+                for value_range in response['valueRanges']]
+
+    def change_version(self):
+        # google drive counts every change made to the spreadsheet
+        # (this is a much smaller request than reading the worksheets)
+        spreadsheet = self.connect()
+
+        response = self.client.request(
+            'get', '{}/{}'.format(gspread.urls.DRIVE_FILES_API_V3_URL,
+                                  spreadsheet.id),
+            params={'fields': 'version', 'supportsAllDrives': True})
+
+        return response.json()['version']
+
+    def worksheet_titles(self, look_up=False):
+        # the worksheets were already found when connecting
+        # (they only need looking up again if the saved ones were used)
+        self.connect(look_up=look_up and not self.looked_up)
+
+        return list(self.worksheet_properties)
+
+    def add_worksheets(self, titles):
+        # every worksheet is added in one request
+        self.connect().batch_update({'requests': [
+            {'addSheet': {'properties': {
+                'title': title,
+                'gridProperties': {'rowCount': NEW_WORKSHEET_ROWS,
+                                   'columnCount': NEW_WORKSHEET_COLS}}}}
+            for title in titles]})
+
+        # the saved details do not have the new worksheets yet
+        self.connect(look_up=True)
+
+
+class sheets_worksheet():
+    """A gspread worksheet with the functions that gspread does not have
+    (everything else is gspread's)"""
+
+    def __init__(self, worksheet):
+        self.worksheet = worksheet
+
+    def __getattr__(self, name):
+        return getattr(self.worksheet, name)
+
+    def delete_row_ranges(self, row_ranges):
+        """This function deletes rows (a list of (first_row, last_row))
+        in one request, the rows below them move up
+
+        gspread's delete_rows can only delete one range in a request,
+        the lowest rows are deleted first so the others do not move"""
+        return self.worksheet.spreadsheet.batch_update({'requests': [
+            {'deleteDimension': {'range': {
+                'sheetId': self.worksheet.id,
+                'dimension': 'ROWS',
+                'startIndex': first_row - 1,
+                'endIndex': last_row}}}
+            for first_row, last_row in sorted(row_ranges, reverse=True)]})
+
+
+# how many coloumns the sqlite worksheets have (A - Z)
+SQLITE_COLUMNS = 26
+
+# the coloumns that get an index in sqlite (book name and due date)
+SQLITE_INDEXED_COLUMNS = [1, 4]
+
+# the due date coloumn holds numbers, so it is stored as one
+# (this lets the index be searched by time)
+SQLITE_NUMERIC_COLUMNS = [4]
+
+
+class sqlite_backend(storage_backend):
+    """The library stored in a local sqlite database file"""
+
+    def __init__(self, filename='library.db'):
+        # the connection can be used by more than one thread
+        # but only one at a time (see the lock)
+        self.connection = sqlite3.connect(filename, check_same_thread=False)
+        self.lock = threading.Lock()
+
+    def open_worksheets(self, titles):
+        return [sqlite_worksheet(self, title) for title in titles]
+
+    def change_version(self):
+        # this changes when another program changes the database file
+        # (the changes made here do not change it)
+        with self.lock:
+            return self.connection.execute('PRAGMA data_version').fetchone()[0]
+
+    def worksheet_titles(self, look_up=False):
+        with self.lock:
+            tables = self.connection.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table'"
+            ).fetchall()
+
+        return [table[0] for table in tables]
+
+    def add_worksheets(self, titles):
+        # the tables are made when the worksheets are opened
+        self.open_worksheets(titles)
+
+
+def quote_name(name):
+    """This function makes a worksheet title safe to use as a table name"""
+    return '"{}"'.format(name.replace('"', '""'))
+
+
+class sqlite_worksheet():
+    """A worksheet stored as a table, one table row for each sheet row
+    (empty rows are not stored)"""
+
+    def __init__(self, backend, title):
+        self.backend = backend
+        self.title = title
+        self.table = quote_name(title)
+
+        # a sqlite table has no real limit on its size
+        self.row_count = 10 ** 9
+        self.col_count = SQLITE_COLUMNS
+
+        columns = []
+        for col in range(1, SQLITE_COLUMNS + 1):
+            if (col in SQLITE_NUMERIC_COLUMNS):
+                columns.append('c{} NUMERIC'.format(col))
+
+            else:
+                columns.append('c{} TEXT'.format(col))
+
+        self.execute('CREATE TABLE IF NOT EXISTS {} '
+                     '(sheet_row INTEGER PRIMARY KEY, {})'.format(
+                         self.table, ', '.join(columns)))
+
+        for col in SQLITE_INDEXED_COLUMNS:
+            self.execute('CREATE INDEX IF NOT EXISTS {} ON {} (c{})'.format(
+                quote_name('{}_c{}'.format(title, col)), self.table, col))
+
+        self.backend.connection.commit()
+
+    def execute(self, sql, parameters=()):
+        with self.backend.lock:
+            return self.backend.connection.execute(sql, parameters).fetchall()
+
+    def executemany(self, sql, parameters):
+        with self.backend.lock:
+            self.backend.connection.executemany(sql, parameters)
+
+    def commit(self):
+        with self.backend.lock:
+            self.backend.connection.commit()
+
+    # --- reads ---
+
+    def read_rows(self, first_row=1, last_row=None):
+        """This function returns {row: list of cell text}
+        for the stored rows between first_row and last_row"""
+        if (last_row is None):
+            last_row = 2 ** 62
+
+        stored_rows = self.execute(
+            'SELECT * FROM {} WHERE sheet_row BETWEEN ? AND ?'.format(
+                self.table), (first_row, last_row))
+
+        # most cells are text or empty, so only the
+        # numbers need to go through cell_text
+        return dict((stored_row[0],
+                     [value if type(value) is str else
+                      '' if value is None else cell_text(value)
+                      for value in stored_row[1:]])
+                    for stored_row in stored_rows)
+
+    def last_row(self):
+        """This function returns the last row that has something in it"""
+        return self.execute('SELECT MAX(sheet_row) FROM {}'.format(
+            self.table))[0][0] or 0
+
+    def get_all_values(self):
+        rows = self.read_rows()
+
+        width = max([len(trim_row(row)) for row in rows.values()], default=0)
+
+        return [rows.get(row, [''] * width)[:width]
+                for row in range(1, self.last_row() + 1)]
+
+    def col_values(self, col):
+        stored_values = self.execute(
+            'SELECT sheet_row, c{0} FROM {1} WHERE c{0} IS NOT NULL '
+            'ORDER BY sheet_row'.format(col, self.table))
+
+        if (stored_values == []):
+            return []
+
+        values = [''] * stored_values[-1][0]
+
+        for row, value in stored_values:
+            values[row - 1] = cell_text(value)
+
+        return trim_row(values)
+
+    def row_values(self, row):
+        return trim_row(self.read_rows(row, row).get(row, []))
+
+    def get(self, range_name):
+        first_row, first_col, last_row, last_col = parse_range(range_name)
+
+        rows = self.read_rows(first_row, last_row)
+
+        if (rows == {}):
+            return []
+
+        values = []
+
+        for row in range(first_row, max(rows) + 1):
+            values.append(trim_row(rows.get(row, [])[first_col - 1:last_col]))
+
+        # empty rows at the end are left out like the sheets API does
+        while values != [] and values[-1] == []:
+            values.pop()
+
+        return values
+
+    def batch_get(self, ranges):
+        return [self.get(range_name) for range_name in ranges]
+
+    def range(self, range_name):
+        first_row, first_col, last_row, last_col = parse_range(range_name)
+
+        if (last_row is None):
+            last_row = self.last_row()
+
+        if (last_col is None):
+            last_col = SQLITE_COLUMNS
+
+        rows = self.read_rows(first_row, last_row)
+
+        cells = []
+        for row in range(first_row, last_row + 1):
+            row_cells = rows.get(row, [''] * SQLITE_COLUMNS)
+
+            for col in range(first_col, last_col + 1):
+                cells.append(cell(row, col, row_cells[col - 1]))
+
+        return cells
+
+    # --- writes ---
+
+    def write_cells(self, changes):
+        """This function writes a list of (row, col, value)
+        (empty values are stored as NULL)"""
+        if (changes == []):
+            return
+
+        self.executemany(
+            'INSERT OR IGNORE INTO {} (sheet_row) VALUES (?)'.format(
+                self.table),
+            [(row,) for row in set(change[0] for change in changes)])
+
+        for col in set(change[1] for change in changes):
+            self.executemany(
+                'UPDATE {} SET c{} = ? WHERE sheet_row = ?'.format(
+                    self.table, col),
+                [(cell_text(value) or None, row)
+                 for row, change_col, value in changes if change_col == col])
+
+        self.delete_empty_rows([(row, row) for row in
+                                set(change[0] for change in changes)])
+        self.commit()
+
+    def delete_empty_rows(self, row_ranges):
+        """This function gets rid of rows that have nothing left in them
+        row_ranges is a list of (first_row, last_row) to check"""
+        self.executemany('DELETE FROM {} WHERE sheet_row BETWEEN ? AND ? '
+                         'AND {}'.format(
+                             self.table,
+                             ' AND '.join('c{} IS NULL'.format(col) for col
+                                          in range(1, SQLITE_COLUMNS + 1))),
+                         row_ranges)
+
+    def block_changes(self, first_row, first_col, values):
+        """This function turns a block of values into (row, col, value)"""
+        return [(first_row + row_offset, first_col + col_offset, value)
+                for row_offset in range(len(values))
+                for col_offset, value in enumerate(values[row_offset])]
+
+    def update(self, range_name, values):
+        first_row, first_col, _, _ = parse_range(range_name)
+
+        self.write_cells(self.block_changes(first_row, first_col, values))
+
+    def batch_update(self, data):
+        changes = []
+
+        for block in data:
+            first_row, first_col, _, _ = parse_range(block['range'])
+            changes += self.block_changes(first_row, first_col,
+                                          block['values'])
+
+        self.write_cells(changes)
+
+    def update_cells(self, cells):
+        self.write_cells([(changed_cell.row, changed_cell.col,
+                           changed_cell.value) for changed_cell in cells])
+
+    def append_rows(self, values, value_input_option='RAW',
+                    insert_data_option=None):
+        """This function adds rows after the last row and says where
+        they went like the sheets API does (the options are ignored)"""
+        if (values == []):
+            return {'updates': {}}
+
+        width = max([len(row) for row in values] + [1])
+
+        with self.backend.lock:
+            connection = self.backend.connection
+
+            # each row goes after the last row, the database is locked
+            # from the first one until they are committed so another
+            # program can not append rows in between them
+            connection.executemany(
+                'INSERT INTO {0} (sheet_row, {1}) '
+                'SELECT COALESCE(MAX(sheet_row), 0) + 1, {2} FROM {0}'.format(
+                    self.table,
+                    ', '.join('c{}'.format(col)
+                              for col in range(1, width + 1)),
+                    ', '.join(['?'] * width)),
+                [[cell_text(value) or None for value in row] +
+                 [None] * (width - len(row)) for row in values])
+
+            last_row = connection.execute('SELECT MAX(sheet_row) FROM {}'
+                                          .format(self.table)).fetchone()[0]
+            connection.commit()
+
+        first_row = last_row - len(values) + 1
+
+        return {'updates': {'updatedRange': "'{}'!A{}:{}{}".format(
+            self.title, first_row, col_to_letter(width), last_row)}}
+
+    def batch_clear(self, ranges):
+        cleared_rows = []
+
+        for range_name in ranges:
+            first_row, first_col, last_row, last_col = parse_range(range_name)
+
+            if (last_row is None):
+                last_row = 2 ** 62
+
+            if (last_col is None):
+                last_col = SQLITE_COLUMNS
+
+            self.execute('UPDATE {} SET {} WHERE sheet_row BETWEEN ? AND ?'.format(
+                self.table,
+                ', '.join('c{} = NULL'.format(col)
+                          for col in range(first_col, last_col + 1))),
+                (first_row, last_row))
+
+            cleared_rows.append((first_row, last_row))
+
+        self.delete_empty_rows(cleared_rows)
+        self.commit()
+
+    def clear(self):
+        self.execute('DELETE FROM {}'.format(self.table))
+        self.commit()
+
+    def delete_row_ranges(self, row_ranges):
+        # the lowest rows are deleted first so the others do not move
+        for first_row, last_row in sorted(row_ranges, reverse=True):
+            self.execute('DELETE FROM {} WHERE sheet_row BETWEEN ? AND ?'
+                         .format(self.table), (first_row, last_row))
+
+            # the rows below move up (through negative numbers,
+            # as the row numbers have to stay different while they move)
+            self.execute('UPDATE {} SET sheet_row = ? - sheet_row '
+                         'WHERE sheet_row > ?'.format(self.table),
+                         (last_row - first_row + 1, last_row))
+            self.execute('UPDATE {} SET sheet_row = -sheet_row '
+                         'WHERE sheet_row < 0'.format(self.table))
+
+        self.commit()
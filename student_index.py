@@ -0,0 +1,30 @@
+"""
+Filename: student_index.py
+Description: This file has an index that stores which rows of the loaned
+    worksheet each student's books are on, so the books a student has out
+    can be found without going through the whole worksheet.
+
+    It works the same way as book_index.py (on the student coloumn
+    instead of the book name), so it is kept up to date by the worksheet
+    cache when books are moved and when gaps are deleted.
+"""
+
+# other files
+from book_index import book_index, normalise
+from catalog import STUDENT_COL
+
+
+class student_index(book_index):
+
+    def __init__(self, col=STUDENT_COL):
+        """col is the coloumn that the student names are stored in"""
+        book_index.__init__(self, col)
+
+    def find_all(self, student_name):
+        """This function returns every row of a student's books
+        (smallest first)"""
+        return list(self.rows.get(normalise(student_name), []))
+
+    def count(self, student_name):
+        """This function returns how many books a student has"""
+        return len(self.rows.get(normalise(student_name), []))
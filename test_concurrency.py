@@ -0,0 +1,101 @@
+"""
+Filename: test_concurrency.py
+Description: This file checks that two clerks using the library at the
+    same time (two library managers on one pretend spreadsheet, syncing
+    rows like they do with google sheets) do not loan the same book twice
+    or write over each other's books.
+
+    python -m unittest test_concurrency
+"""
+
+import unittest
+# other files
+from fake_sheets import fake_backend
+from storage import sqlite_worksheet
+from v3 import library_manager
+
+
+def sheet_names(backend, title):
+    """This function gets the book names in a worksheet of the backend"""
+    return [row[0] for row in sqlite_worksheet(backend, title)
+            .get_all_values() if row != [] and row[0] != '']
+
+
+class two_clerks_test(unittest.TestCase):
+
+    def setUp(self):
+        self.backend = fake_backend()
+        self.backend.seed('available', [['book {}'.format(number),
+                                         'fiction']
+                                        for number in range(10)])
+        self.backend.seed('loaned', [])
+
+        # both clerks sync rows like with google
+        self.clerk_a = library_manager(self.backend, sync_rows=True)
+        self.clerk_b = library_manager(self.backend, sync_rows=True)
+
+    def loan(self, clerk, book_name, student_name):
+        """This function loans a book like loan_book does
+        (nothing is loaned if the clerk can not find it)"""
+        shard = clerk.shards.shard_for(book_name)
+        book_row = shard.available_books.find_row(book_name, 1)
+
+        if (book_row == -1):
+            return
+
+        clerk.loan_rows([(shard, book_row)], [student_name])
+
+    def test_book_is_only_loaned_once(self):
+        self.clerk_a.sync()
+        self.clerk_b.sync()
+
+        self.loan(self.clerk_a, 'book 5', 'alice')
+
+        # clerk b syncs after clerk a's loan, so it has to see that
+        # the book's row is empty straight away
+        self.clerk_b.sync()
+        self.loan(self.clerk_b, 'book 5', 'bob')
+
+        self.clerk_a.flush()
+        self.clerk_b.flush()
+
+        self.assertEqual(sheet_names(self.backend, 'loaned'), ['book 5'])
+        self.assertNotIn('book 5', sheet_names(self.backend, 'available'))
+
+    def test_stale_clerk_does_not_loan_a_loaned_book(self):
+        self.clerk_a.sync()
+        self.clerk_b.sync()
+
+        self.loan(self.clerk_a, 'book 5', 'alice')
+
+        # clerk b has not synced at all
+        self.loan(self.clerk_b, 'book 5', 'bob')
+
+        self.clerk_a.flush()
+        self.clerk_b.flush()
+
+        self.assertEqual(sheet_names(self.backend, 'loaned'), ['book 5'])
+
+    def test_book_in_a_gap_is_not_written_over(self):
+        self.loan(self.clerk_b, 'book 5', 'bob')
+
+        # clerk a puts a new book in the gap book 5 left
+        self.clerk_a.sync()
+        self.clerk_a.add_books([['a new', 'fiction']])
+
+        # clerk b has not synced, so it still thinks the gap is empty
+        self.clerk_b.add_books([['b new', 'fiction']])
+
+        available = sheet_names(self.backend, 'available')
+
+        self.assertIn('a new', available)
+        self.assertIn('b new', available)
+        self.assertEqual(len(available), 11)
+
+        # clerk b's local copy has what is in the worksheet now
+        self.assertEqual(self.clerk_b.shards.shards[0].available_books
+                         .value(6, 1), 'a new')
+
+
+if (__name__ == '__main__'):
+    unittest.main()
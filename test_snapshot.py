@@ -0,0 +1,87 @@
+"""
+Filename: test_snapshot.py
+Description: This file checks that a library manager started from a
+    snapshot (see snapshot.py) reads the books from it straight away,
+    while the worksheets are still being downloaded in the background.
+
+    python -m unittest test_snapshot
+"""
+
+import os
+import tempfile
+import threading
+import unittest
+# other files
+from fake_sheets import fake_backend
+from storage import sqlite_worksheet
+from v3 import library_manager
+
+# the longest the download waits to be let through (seconds),
+# so the test fails instead of hanging if something waits for it
+DOWNLOAD_WAIT = 5
+
+
+class slow_backend(fake_backend):
+    """A pretend spreadsheet whose worksheets are only downloaded
+    once download is set"""
+
+    def __init__(self):
+        fake_backend.__init__(self)
+        self.download = threading.Event()
+        self.download.set()
+
+    def batch_get_values(self, worksheets):
+        self.download.wait(DOWNLOAD_WAIT)
+
+        return fake_backend.batch_get_values(self, worksheets)
+
+
+class snapshot_test(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.snapshot_file = os.path.join(self.folder.name, 'snapshot')
+
+        self.backend = slow_backend()
+        self.backend.seed('available', [['book {}'.format(number),
+                                         'fiction']
+                                        for number in range(10)])
+        self.backend.seed('loaned', [])
+
+        # the last run saves a snapshot when it ends
+        library_manager(self.backend, sync_rows=True,
+                        snapshot_file=self.snapshot_file).save_snapshot()
+
+    def tearDown(self):
+        self.backend.download.set()
+        self.folder.cleanup()
+
+    def test_read_from_snapshot_before_download(self):
+        # another clerk adds a book after the snapshot was saved
+        sqlite_worksheet(self.backend, 'available').append_rows(
+            [['new book', 'fiction']])
+
+        self.backend.download.clear()
+        clerk = library_manager(self.backend, sync_rows=True,
+                                snapshot_file=self.snapshot_file)
+        books = clerk.shards.shards[0].available_books
+
+        # the menu syncs before each option, that does not wait for the
+        # download and the books are read from the snapshot
+        clerk.sync()
+
+        self.assertTrue(books.reconciling())
+        self.assertIn('book 5', books.col_values(1))
+        self.assertNotIn('new book', books.col_values(1))
+
+        # the download brings the snapshot up to date
+        self.backend.download.set()
+        clerk.shards.wait_reconciled()
+        clerk.sync()
+
+        self.assertFalse(books.reconciling())
+        self.assertIn('new book', books.col_values(1))
+
+
+if (__name__ == '__main__'):
+    unittest.main()
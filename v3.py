@@ -9,6 +9,8 @@ Description: This program will allow the user to:
         return books
         view books (available and loaned)
         see books that are close to due date
+        see a report of the loaned books
+        see and return all the books a student has
 
 Version: 3.0
 
@@ -16,15 +18,59 @@ Link: https://docs.google.com/spreadsheets/d/1cWH1xguStiyFoVgJWaLb2kMNlAGlbEnt4M
 
 IMPORTANT: you NEED to connected to the internet
            for the database to be connected
+           (unless a local database is used: python v3.py --sqlite library.db)
 """
 
-import gspread
+import argparse
+import atexit
 import sys
 import time
-# other file
+# other files
 from valid_input import *
-
-
+from storage import sheets_backend, sqlite_backend, letter_to_col
+from shards import load_shards, reshard
+from worksheet_cache import row_runs
+from delta_sync import delta_sync
+from snapshot import (SNAPSHOT_FILE, snapshot_source, read_snapshot,
+                      write_snapshot)
+from search_index import enable_completion
+from analytics import loan_report
+from bulk_import import import_books
+from batch_mode import run_script
+from concurrent_io import run_together
+from instrumentation import (session_stats, instrumented_backend,
+                             operation, tracked)
+from scheduler import request_scheduler, scheduled_backend, request_failed
+
+# how many seconds the local copy of the worksheets is trusted for
+# before it is downloaded again (None to never download it again)
+CACHE_REFRESH_TIME = 5 * 60
+
+# the most rows a worksheet can have
+# (the library can hold more by using more shards, see shards.py)
+MAX_ROWS = 1000
+
+# how many times a book is looked for again if someone else
+# has moved it while it was being loaned or returned
+MOVE_RETRIES = 3
+
+# how much of a worksheet can be gaps (empty rows left by moved books)
+# before they are deleted, until then new books are put in the gaps
+GAP_THRESHOLD = 0.25
+
+# the most books a student can have loaned at once
+MAX_LOANS = 5
+
+# how long books are loaned for (3 weeks in seconds)
+LOAN_TIME = 21 * 24 * 60 * 60
+
+
+def loan_due_time():
+    """This function gets the time stamp that a book loaned now is due"""
+    return round(time.time(), 0) + LOAN_TIME
+
+
+@tracked('next_available_row')
 def next_available_row(worksheet):
     """This function gets then next line in a worksheet"""
     # gets the first coloumn of the worksheet
@@ -34,8 +80,31 @@ def next_available_row(worksheet):
     return len(worksheet_coloumn) + 1
 
 
+def used_rows(worksheet):
+    """This function gets how many rows have a book in them"""
+    gap_count = 0
+    if (hasattr(worksheet, 'gap_rows')):
+        gap_count = len(worksheet.gap_rows())
+
+    return next_available_row(worksheet) - 1 - gap_count
+
+
+def fragmented(worksheet, threshold=GAP_THRESHOLD):
+    """This function checks if more of a worksheet's rows are gaps
+    than the threshold (so they should be deleted)"""
+    row_count = next_available_row(worksheet) - 1
+
+    return row_count - used_rows(worksheet) > threshold * row_count
+
+
+@tracked('find_book')
 def find_book(worksheet, book_name, col):
     """This function finds the line that a certain book is stored"""
+    # cached worksheets can look the book up in their index
+    # without going through the coloumn
+    if (hasattr(worksheet, 'find_row')):
+        return worksheet.find_row(book_name, col)
+
     # gets the first coloumn of the worksheet
     worksheet_items = list(worksheet.col_values(col))
 
@@ -48,117 +117,338 @@ def find_book(worksheet, book_name, col):
     return book_row
 
 
+def group_by_shard(book_rows, student_names=None):
+    """This function splits a list of (shard, row) into
+    a list of (shard, rows, student names) for each shard
+    (student_names has a name for each row, if it is given)"""
+    if (student_names is None):
+        student_names = [None] * len(book_rows)
+
+    groups = {}
+    for (shard, row), student_name in zip(book_rows, student_names):
+        rows, names = groups.setdefault(shard, ([], []))
+
+        rows.append(row)
+        names.append(student_name)
+
+    return [(shard, rows, names) for shard, (rows, names) in groups.items()]
+
+
+@tracked('move_book')
 def move_book(worksheet1, worksheet2, rows,
               range1='A', range2='Z', other_info=[]):
-    """This function moves a book from one worksheet to another"""
+    """This function moves a book from one worksheet to another
+    (it only uses 3 requests no matter how many books are moved,
+    and the last 2 are sent at the same time, 1 more for worksheets
+    that can check their rows)
+
+    The rows are checked first in case someone else has changed them
+    since they were found, the rows that have a different book in them
+    now are not moved and are returned"""
 
     new_cells = []
 
-    for _ in range(len(rows)):
-        new_cells.append([])
+    # downloads the rows again to check they still have the same books
+    changed_rows = []
+    if (hasattr(worksheet1, 'verify_rows')):
+        changed_rows = worksheet1.verify_rows(rows)
+
+    if (changed_rows != []):
+        if (other_info != []):
+            other_info = [other_info[index] for index in range(len(rows))
+                          if rows[index] not in changed_rows]
+
+        rows = [row for row in rows if row not in changed_rows]
+
+    if (rows == []):
+        return changed_rows
 
-    # stores the row
+    # the range of each row that is being moved and where it is in rows
+    # (a row is only moved once even if it was entered twice)
+    row_ranges = []
+    row_indexes = []
     for index in range(len(rows)):
+        row_range = '{}{}:{}{}'.format(range1, rows[index], range2, rows[index])
+
+        if (row_range not in row_ranges):
+            row_ranges.append(row_range)
+            row_indexes.append(index)
+
+    # how many cells are in each row
+    row_width = letter_to_col(range2) - letter_to_col(range1) + 1
 
-        # gets the current rows data
-        cells = worksheet1.range('{}{}:{}{}'.format(range1, rows[index],
-                                                    range2, rows[index]))
+    # gets all the rows data at once
+    rows_values = worksheet1.batch_get(row_ranges)
 
-        # clears all the old cells
-        for cell in cells:
-            new_cells[index].append(cell.value)
-            cell.value = ''
+    for range_index in range(len(row_ranges)):
+
+        # empty cells at the end of the row are left out by the sheet
+        # so they are added back
+        cells = []
+        if (rows_values[range_index] != []):
+            cells = list(rows_values[range_index][0])
+
+        cells += [''] * (row_width - len(cells))
 
         if (other_info != []):
-            for info in other_info[index]:
-                new_cells[index].append(info)
+            for info in other_info[row_indexes[range_index]]:
+                cells.append(info)
+
+        new_cells.append(cells)
 
-        # updates with old cells that have been cleared
-        worksheet1.update_cells(cells)
+    # cached worksheets put the books in their gaps first
+    add_rows = worksheet2.append_rows
+    if (hasattr(worksheet2, 'add_rows')):
+        add_rows = worksheet2.add_rows
 
-    # adds cells from other worksheet
-    worksheet2.update('A{}'.format(next_available_row(worksheet2)), new_cells)
+    # clears all the old rows at once (the whole row is cleared
+    # so nothing is left behind in the coloumns that were not moved)
+    # and adds cells to the other worksheet at the same time
+    # (the gaps are checked and the worksheet picks the rows after
+    # its last one, so other clerks' are not written over)
+    run_together(
+        (worksheet1.batch_clear, ['A{}:Z{}'.format(rows[index], rows[index])
+                                  for index in row_indexes]),
+        (add_rows, new_cells))
 
+    return changed_rows
 
+
+@tracked('delete_gaps')
 def delete_gaps(worksheet):
-    """Takes a worksheet and gets rid of white spaces"""
-    good_rows = []
-    good_rows_content = []
+    """Takes a worksheet and gets rid of white spaces
+    (the empty rows are deleted in the worksheet in one request and the
+    rows below move up, nothing is written again so rows that other
+    clerks are writing at the same time are not written over)"""
     # gets the first coloumn of the worksheet
     worksheet_coloumn = list(worksheet.col_values(1))
 
-    for row in range(len(worksheet_coloumn)):
-        if (worksheet_coloumn[row] != ''):
-            good_rows.append(row + 1)
-
-    for good_row in good_rows:
-        good_rows_content.append(
-            worksheet.get('A{}:Z{}'.format(good_row, good_row))[0]
-            )
+    gap_rows = [row for row in range(1, len(worksheet_coloumn) + 1)
+                if worksheet_coloumn[row - 1] == '']
 
-    worksheet.clear()
+    if (gap_rows == []):
+        return
 
-    worksheet.update('A1', good_rows_content)
+    # someone else could have added a book in a gap since it was read
+    if (hasattr(worksheet, 'verify_rows')):
+        filled_rows = worksheet.verify_rows(gap_rows)
+        gap_rows = [row for row in gap_rows if row not in filled_rows]
 
+    if (gap_rows != []):
+        worksheet.delete_row_ranges(row_runs(gap_rows))
 
-def view_books(columns):
-    """This function prints the books from a list"""
 
-    # the individual outputs will be printed from here
+def view_books(columns, delay=0, page_size=None):
+    """This function prints the books from a list
 
-    # gets the length of coloumn 0 as it is assumed -
-    # that all nested list are the same in size
-    outputs = [''] * len(columns[0])
+    delay is how many seconds to wait between rows (to make it look nice)
+    page_size is how many rows to show before asking to show more
+    (None to show every row at once)"""
 
-    try:
+    # the longest coloumn is used as the number of rows
+    # (shorter coloumns are filled in with blanks)
+    row_count = max([len(column) for column in columns], default=0)
 
-        for column in columns:
+    # finds the length of longest word in each coloumn
+    # and adds one for spacing
+    widths = []
+    for column in columns:
+        widths.append(max([len(item) for item in column], default=0) + 1)
 
-            # finds the length of longest word and adds one for spacing
-            longest_word = len(max(column, key=len)) + 1
+    if (row_count == 0):
+        print('No books to print!')
 
-            for index in range(len(column)):
+    # the individual outputs will be made here
+    outputs = []
 
-                item = column[index]
+    for index in range(row_count):
+        output = []
 
-                # converts into spaces
-                spacing = (longest_word - len(item)) * ' '
+        for col in range(len(columns)):
+            item = ''
+            if (index < len(columns[col])):
+                item = columns[col][index]
 
+            # last coloumn does not get a divider
+            spacer = '|'
+            if (col == len(columns) - 1):
                 spacer = ''
 
-                # last index
-                if (columns.index(column) != len(columns) - 1):
-                    spacer = '|'
+            output.append('{} {} '.format(item.ljust(widths[col]), spacer))
 
-                outputs[index] += '{}{} {} '.format(item, spacing, spacer)
+        outputs.append(''.join(output))
 
-    except ValueError:
-        print('No books to print!')
+    if (page_size is None):
+        page_size = max(row_count, 1)
+
+    for page_start in range(0, row_count, page_size):
+        page = outputs[page_start:page_start + page_size]
 
-    for output in outputs:
-        time.sleep(0.1)
-        print(output)
+        if (delay > 0):
+            for output in page:
+                time.sleep(delay)
+                print(output)
+
+        else:
+            # prints the whole page at once
+            sys.stdout.write('\n'.join(page) + '\n')
+
+        # asks before showing the next page
+        if (page_start + page_size < row_count):
+            more = input('Showing {} of {} (enter for more, # to stop): '
+                         .format(page_start + len(page), row_count))
+
+            if (more.strip() == '#'):
+                break
 
     print('_______________________________________________\n')
 
 
 class library_manager():
 
-    def __init__(self):
+    def __init__(self, backend=None, refresh_time=CACHE_REFRESH_TIME,
+                 stats=None, scheduler=None, snapshot_file=None,
+                 sync_rows=None):
         """This function initialises all the
-        variables to be used in the program"""
-        # connects to the service account
-        self.service_account = gspread.service_account(filename='config.json')
-        self.library_spreadsheet = self.service_account.open(
-                                                        'library database')
-
-        # these are for the 2 different worksheets (available, loaned)
-        self.available_books = self.library_spreadsheet.worksheet('available')
-        self.loaned_books = self.library_spreadsheet.worksheet('loaned')
+        variables to be used in the program
+
+        backend is where the books are stored (see storage.py),
+        the google spreadsheet is used if it is not given
+        stats is a session_stats that records every request
+        (see instrumentation.py)
+        scheduler is a request_scheduler that keeps the requests inside
+        the quota (see scheduler.py), the google spreadsheet
+        gets one if it is not given
+        snapshot_file is where a copy of the worksheets is saved when the
+        program ends, so the next run can start from it (see snapshot.py)
+        (None to always download the worksheets before starting)
+        sync_rows is True to stamp every row that is written and only
+        download the rows other clerks have changed (see delta_sync.py),
+        the google spreadsheet does this if it is not given"""
+        # (it logs in when the worksheets are downloaded below,
+        # with the login saved by the last run if it has not run out)
+        if (backend is None):
+            backend = sheets_backend()
+
+        self.snapshot_file = snapshot_file
+        self.snapshot_source = snapshot_source(backend)
+
+        snapshot = None
+        if (snapshot_file is not None):
+            snapshot = read_snapshot(snapshot_file, self.snapshot_source)
+
+        if (isinstance(backend, sheets_backend) and scheduler is None):
+            scheduler = request_scheduler()
+
+        if (sync_rows is None):
+            sync_rows = isinstance(backend, sheets_backend)
+
+        # the stats are recorded under the scheduler so
+        # retried requests are counted
+        if (stats is not None):
+            backend = instrumented_backend(backend, stats)
+
+        if (scheduler is not None):
+            backend = scheduled_backend(backend, scheduler)
+
+        self.backend = backend
+        self.refresh_time = refresh_time
+        self.sync_rows = sync_rows
+
+        # gets the changes other clerks have made (see sync)
+        self.syncer = None
+        if (sync_rows):
+            self.syncer = delta_sync(self.backend)
+
+        # the worksheets (available, loaned) of each shard,
+        # they are downloaded together and kept locally
+        # so that looking up books does not need the internet
+        # (each shard has its own indexes, see shards.py)
+        self.shards = load_shards(self.backend, refresh_time, snapshot,
+                                  sync_rows)
 
         # to make the program look nice
         self.spacer = '_______________________________________________\n'
 
+        # the most rows each available worksheet can have
+        self.max_rows = MAX_ROWS
+
+        # the most books each student can have
+        self.max_loans = MAX_LOANS
+
+        # how much of a worksheet can be gaps before they are deleted
+        self.gap_threshold = GAP_THRESHOLD
+
+        # how long to wait between printed rows (see view_books)
+        self.view_delay = 0
+
+        # how many rows to print before asking to print more
+        self.page_size = None
+
+    def flush(self):
+        """This function sends the row stamps that could not be sent yet
+        (one after the other, as the thread pool can not be used
+        while the program is ending)"""
+        self.shards.flush()
+
+    def sync(self):
+        """This function gets the rows that other clerks have changed
+        since the last time (see delta_sync.py)"""
+        if (self.syncer is None):
+            return
+
+        self.syncer.sync(self.shards.worksheets())
+
+    def save_snapshot(self):
+        """This function saves a copy of every worksheet for the next run
+        (see snapshot.py)"""
+        if (self.snapshot_file is None):
+            return
+
+        write_snapshot(self.snapshot_file, self.snapshot_source,
+                       dict((worksheet.title, worksheet.rows)
+                            for worksheet in self.shards.worksheets()))
+
+    def reshard(self, shard_count):
+        """This function spreads the books over shard_count shards
+        (see shards.py)"""
+        print('Moving the books into {} shard(s)...'.format(shard_count))
+
+        # every book has to be up to date before it is moved
+        self.shards.wait_reconciled()
+
+        reshard(self.backend, self.shards, shard_count, self.refresh_time,
+                self.sync_rows)
+
+        # downloaded again so the new shards get their indexes
+        self.shards = load_shards(self.backend, self.refresh_time,
+                                  stamp_rows=self.sync_rows)
+
+        print('Done.')
+        print(self.spacer)
+
+    def compact(self):
+        """This function deletes the gaps in every worksheet
+        (however few there are)"""
+        print('Deleting the gaps...')
+
+        for shard in self.shards:
+            delete_gaps(shard.available_books)
+            delete_gaps(shard.loaned_books)
+
+        print('Done.')
+        print(self.spacer)
+
+    def shard_space(self, shard):
+        """This function gets how many more books can be added to a shard
+        (its available worksheet can hold max_rows - 1, the gaps
+        count as space as books are put in them first)"""
+        return max(self.max_rows - 1 - used_rows(shard.available_books), 0)
+
+    def free_rows(self):
+        """This function gets how many more books can be added"""
+        return sum([self.shard_space(shard) for shard in self.shards])
+
     def add_book(self):
         """This function allows the user to add books to the database"""
         # this dict allows that program to turn the 'f' and 'nf' to
@@ -173,9 +463,7 @@ class library_manager():
             'Please enter a positive integer between (1 - 100)!\n',
             1, 100)
 
-        next_row = next_available_row(self.available_books)
-
-        if (amount_of_books + next_row <= 1000):
+        if (amount_of_books <= self.free_rows()):
 
             new_book = []
             for _ in range(amount_of_books):
@@ -190,12 +478,7 @@ class library_manager():
                     'Please enter a valid name!')
 
                 # checks if book is in library
-                is_available = find_book(self.available_books, book_name, 1)
-                is_loaned = find_book(self.loaned_books, book_name, 1)
-
-                # adds them together
-                # if they are both -1 (not found)
-                if (is_available == -1 and is_loaned == -1):
+                if (not self.has_book(book_name)):
                     # if it is not found, it adds the name
                     new_book[x].append(book_name)
 
@@ -222,33 +505,58 @@ class library_manager():
                 print()
 
             # gets rid of empty spaces (book found in library)
-            if (new_book != []):
-                empty_books = []
-
-                for book in range(len(new_book)):
-                    if (new_book[book] == []):
-                        empty_books.append(book)
-
-                for empty_book in empty_books:
-                    new_book.pop(empty_book)
+            new_book = [book for book in new_book if book != []]
 
-                print(self.spacer)
+            print(self.spacer)
 
-            next_row = next_available_row(self.available_books)
-            self.available_books.update('A{}'.format(next_row), new_book)
+            # the shards the books go in can still be full
+            if (not self.add_books(new_book)):
+                print('Sorry, the library does not have enough space.')
 
         else:
             print('Sorry, the library does not have enough space.')
 
+    def has_book(self, book_name):
+        """This function checks if a book is in the library
+        (available or loaned out)"""
+        # it would be in the shard its name goes in
+        shard = self.shards.shard_for(book_name)
+
+        return (find_book(shard.available_books, book_name, 1) != -1 or
+                find_book(shard.loaned_books, book_name, 1) != -1)
+
+    def add_books(self, new_books):
+        """This function writes new books ([name, fiction])
+        to the gaps or the end of the available worksheet of their shards
+        (returns False if there is not enough space)"""
+        # the new books that go in each shard
+        shard_books = {}
+        for book in new_books:
+            shard_books.setdefault(self.shards.shard_for(book[0]),
+                                   []).append(book)
+
+        # nothing is added unless every shard has space
+        for shard, books in shard_books.items():
+            if (len(books) > self.shard_space(shard)):
+                return False
+
+        # the books go in the gaps that are still empty, then after the
+        # last row the worksheet has (not the last one here,
+        # someone else could have added books)
+        for shard, books in shard_books.items():
+            shard.available_books.add_rows(books)
+
+        return True
+
     def loan_book(self):
         """This function allows the user to loan books to students"""
 
-        # this list is used for storing all the rows
-        # of te books that the user is loaning
+        # this list is used for storing the shard and row
+        # of the books that the user is loaning
         book_rows = []
 
         # used to store the names of the students
-        additional_info = []
+        student_names = []
 
         # name of book and student
         loan_book = ''
@@ -264,19 +572,24 @@ class library_manager():
                 student_name = str_valid_input(
                     'Please enter the name of the student: ',
                     'Please enter a valid name! (not digits or just spaces)')
+
+                # (with the books being loaned to them now)
+                if (self.loan_limit_reached(
+                        student_name, student_names.count(student_name))):
+                    print('Sorry, {} already has {} books loaned.'.format(
+                        student_name, self.max_loans))
+                    continue
+
                 # finds the row of the said book name
-                book_row = find_book(self.available_books, loan_book, 1)
+                shard, book_row = self.find_or_suggest(loan_book, False)
 
                 # if the function does not return -1 (not found)
                 # it adds the new row to a list
                 if (book_row != -1):
-                    book_rows.append(book_row)
-
-                    # adds the students name and the time + 3 weeks in seconds
-                    three_weeks_seconds = 21 * 24 * 60 * 60
-                    time_stamp = round(time.time(), 0) + three_weeks_seconds
+                    book_rows.append((shard, book_row))
 
-                    additional_info.append([student_name, time_stamp])
+                    # adds the students name
+                    student_names.append(student_name)
                     print('Found book!')
 
                 # if the book row is not found
@@ -284,22 +597,40 @@ class library_manager():
                 elif (book_row == -1):
                     print('Sorry, could not find your book.')
 
-        # moves the books if there are books to move
-        if (book_rows != []):
-            move_book(self.available_books,
-                      self.loaned_books, book_rows,
-                      range2='B', other_info=additional_info)
-            print('Loaned out books.')
-
-        # gets rid of gaps
-        delete_gaps(self.available_books)
+        self.print_moved(book_rows, self.loan_rows(book_rows, student_names),
+                         'Loaned out books.')
 
         print(self.spacer)
 
+    def loan_limit_reached(self, student_name, loaning=0):
+        """This function checks if a student can not be loaned another
+        book (loaning is how many books are already being loaned to them)"""
+        return (len(self.shards.student_rows(student_name)) + loaning >=
+                self.max_loans)
+
+    def loan_rows(self, book_rows, student_names):
+        """This function loans the books on the given (shard, row)s of the
+        available worksheets to the students (one name for each row)
+        and returns the names of the books someone else moved first"""
+        # adds the students name and the time + 3 weeks
+        due_time = loan_due_time()
+
+        moved_shards, changed_books = self.move_rows(
+            book_rows, False, [[student_name, due_time]
+                               for student_name in student_names])
+
+        # gets rid of gaps if there are too many of them
+        # (in the shards that books were moved from)
+        for shard in moved_shards:
+            if (fragmented(shard.available_books, self.gap_threshold)):
+                delete_gaps(shard.available_books)
+
+        return changed_books
+
     def return_book(self):
         """This function allows users to reutrn books"""
-        # this list is used for storing all the rows
-        # of te books that the user is returning
+        # this list is used for storing the shard and row
+        # of the books that the user is returning
         book_rows = []
 
         # name of book
@@ -314,12 +645,12 @@ class library_manager():
             if (return_book != '#'):
 
                 # finds the row of the said book name
-                book_row = find_book(self.loaned_books, return_book, 1)
+                shard, book_row = self.find_or_suggest(return_book, True)
 
                 # if the function does not return -1 (not found)
                 # it adds the new row to a list
                 if (book_row != -1):
-                    book_rows.append(book_row)
+                    book_rows.append((shard, book_row))
                     print('Found book!')
 
                 # if the book row is not found
@@ -327,89 +658,465 @@ class library_manager():
                 elif (book_row == -1):
                     print('Sorry, could not find the book.')
 
-        # moves the books
+        self.print_moved(book_rows, self.return_rows(book_rows),
+                         'Returned books.')
+
+        print(self.spacer)
 
-        if (book_rows != []):
-            move_book(self.loaned_books,
-                      self.available_books,
-                      book_rows, range2='B')
-            print('Returned books.')
+    def return_student(self):
+        """This function returns every book a student has"""
+        student_name = str_valid_input(
+            'Please enter the name of the student: ',
+            'Please enter a valid name! (not digits or just spaces)')
 
-        # gets rid of gaps
-        delete_gaps(self.loaned_books)
+        book_rows = self.shards.student_rows(student_name)
+
+        if (book_rows == []):
+            print('{} does not have any books loaned.'.format(student_name))
+
+        else:
+            # (every book is moved together)
+            self.print_moved(book_rows, self.return_rows(book_rows),
+                             'Returned books.')
 
         print(self.spacer)
 
+    def print_moved(self, book_rows, changed_books, message):
+        """This function says which books someone else changed first
+        (so they were not moved) and prints message if any books were"""
+        for book_name in changed_books:
+            print('Sorry, {} was just changed by someone else.'.format(
+                book_name))
+
+        if (len(changed_books) < len(set(book_rows))):
+            print(message)
+
+    def find_or_suggest(self, book_name, loaned):
+        """This function finds the shard and row of a book in the
+        available (or loaned) worksheets, if it is not there the closest
+        book names are shown to pick from (row -1 if none are picked)"""
+        shard = self.shards.shard_for(book_name)
+        book_row = find_book(shard.books(loaned), book_name, 1)
+
+        if (book_row != -1):
+            return shard, book_row
+
+        suggestions = self.shards.suggest(book_name, loaned)
+
+        if (suggestions == []):
+            return shard, -1
+
+        print('Could not find {}, did you mean:'.format(book_name))
+        for index in range(len(suggestions)):
+            print('[{}] {}'.format(index + 1, suggestions[index]))
+
+        choice = int_valid_input(
+            'Pick a book (0 if it is not there): ',
+            'Please enter a valid option!\n', 0, len(suggestions))
+
+        if (choice == 0):
+            return shard, -1
+
+        # the book picked can be in a different shard
+        shard = self.shards.shard_for(suggestions[choice - 1])
+
+        return shard, find_book(shard.books(loaned), suggestions[choice - 1], 1)
+
+    def return_rows(self, book_rows):
+        """This function returns the books on the given (shard, row)s
+        of the loaned worksheets and returns the names of the books
+        someone else moved first"""
+        moved_shards, changed_books = self.move_rows(book_rows, True)
+
+        # gets rid of gaps if there are too many of them
+        # (in the shards that books were moved from)
+        for shard in moved_shards:
+            if (fragmented(shard.loaned_books, self.gap_threshold)):
+                delete_gaps(shard.loaned_books)
+
+        return changed_books
+
+    def move_rows(self, book_rows, loaned, other_info=None):
+        """This function moves the books on the given (shard, row)s from
+        the available worksheets to the loaned ones (from the loaned ones
+        if loaned is True), other_info is added to the end of each row
+
+        A book that someone else has moved since it was found is found
+        again by its name and tried again (MOVE_RETRIES times), this
+        returns the shards that books were moved from and the names of
+        the books that could not be moved"""
+        if (other_info is None):
+            other_info = [[] for _ in book_rows]
+
+        # the name of each book, so it can be found again
+        book_names = [shard.books(loaned).value(row, 1)
+                      for shard, row in book_rows]
+
+        moved_shards = []
+        not_moved = []
+
+        for attempt in range(MOVE_RETRIES + 1):
+            changed_books = []
+
+            # each shard only moves its own books
+            for shard, rows, books in group_by_shard(
+                    book_rows, list(zip(book_names, other_info))):
+                changed_rows = move_book(shard.books(loaned),
+                                         shard.books(not loaned), rows,
+                                         range2='B',
+                                         other_info=[info for _, info
+                                                     in books])
+
+                if (len(changed_rows) < len(set(rows)) and
+                        shard not in moved_shards):
+                    moved_shards.append(shard)
+
+                changed_books += [(shard, book) for row, book
+                                  in zip(rows, books) if row in changed_rows]
+
+            if (changed_books == []):
+                break
+
+            # gets where the books are now
+            if (self.syncer is not None):
+                self.sync()
+
+            else:
+                for shard in set([shard for shard, _ in changed_books]):
+                    shard.books(loaned).refresh()
+
+            book_rows = []
+            book_names = []
+            other_info = []
+
+            for shard, (book_name, info) in changed_books:
+                book_row = find_book(shard.books(loaned), book_name, 1)
+
+                # someone else has already loaned (or returned) it
+                if (book_row == -1 or attempt == MOVE_RETRIES):
+                    not_moved.append(book_name)
+                    continue
+
+                book_rows.append((shard, book_row))
+                book_names.append(book_name)
+                other_info.append(info)
+
+            if (book_rows == []):
+                break
+
+        return moved_shards, not_moved
+
     def view_available(self):
         print('These are the book(s) that are available to loan:\n')
 
-        book_names = list(self.available_books.col_values(1))
-        book_fiction = list(self.available_books.col_values(2))
-
-        view_books([book_names, book_fiction])
+        # every shard's books one after the other
+        book_names = []
+        book_fiction = []
+        for shard in self.shards:
+            names = shard.available_books.col_values(1)
+            fiction = shard.available_books.col_values(2)
+            fiction += [''] * (len(names) - len(fiction))
+
+            # the coloumns are lined up before the next shard is added
+            # (gaps are left out)
+            book_names += [names[index] for index in range(len(names))
+                           if names[index] != '']
+            book_fiction += [fiction[index] for index in range(len(names))
+                             if names[index] != '']
+
+        view_books([book_names, book_fiction], self.view_delay,
+                   self.page_size)
 
     def view_loaned(self):
         print('These are the book(s) that are currently loaned:\n')
 
-        book_names = list(self.loaned_books.col_values(1))
-        book_fiction = list(self.loaned_books.col_values(2))
+        book_names = []
+        book_fiction = []
+        for shard in self.shards:
+            names = shard.loaned_books.col_values(1)
+            fiction = shard.loaned_books.col_values(2)
+            fiction += [''] * (len(names) - len(fiction))
+
+            # the coloumns are lined up before the next shard is added
+            # (gaps are left out)
+            book_names += [names[index] for index in range(len(names))
+                           if names[index] != '']
+            book_fiction += [fiction[index] for index in range(len(names))
+                             if names[index] != '']
+
+        view_books([book_names, book_fiction], self.view_delay,
+                   self.page_size)
+
+    def import_books(self, filename):
+        """This function adds all the books in a file (csv or jsonl)
+        without asking about each one"""
+        print('Importing books from {}...'.format(filename))
+
+        # the books already in the library have to be up to date
+        # so they are not added again
+        self.shards.wait_reconciled()
+
+        report = import_books(self, filename)
+        report.print_report()
 
-        view_books([book_names, book_fiction])
+        print(self.spacer)
 
-    def view_due(self):
+    def view_due(self, days=20):
         """"This function allows the user to
         view the books taht are due soon"""
-        due_books = []
-        book_names = []
-        book_owners = []
-        time_till_due = []
-
         # n number of days in seconds
         #
         #           n
         #           ^
-        threshold = 20 * 24 * 60 * 60
+        threshold = days * 24 * 60 * 60
+
+        now = time.time()
+
+        self.print_due_books(lambda shard: shard.due_dates.due_before(
+            now + threshold), now)
+
+    def view_overdue(self):
+        """This function allows the user to view the books that are overdue"""
+        print('These are the book(s) that are overdue:\n')
+
+        now = time.time()
+
+        self.print_due_books(lambda shard: shard.due_dates.overdue(now), now)
+
+    def view_student(self, student_name=None):
+        """This function allows the user to view
+        the books that a student has loaned"""
+        if (student_name is None):
+            student_name = str_valid_input(
+                'Please enter the name of the student: ',
+                'Please enter a valid name! (not digits or just spaces)')
+
+        print('These are the book(s) loaned to {}:\n'.format(student_name))
+
+        self.print_due_books(lambda shard: shard.students.find_all(
+            student_name), time.time())
+
+    def view_due_between(self):
+        """This function allows the user to view
+        the books that are due between two dates"""
+        start = date_valid_input(
+            'Please enter the first date (DD/MM/YYYY): ',
+            'Please enter a valid date! (like 25/12/2022)\n')
+        end = date_valid_input(
+            'Please enter the last date (DD/MM/YYYY): ',
+            'Please enter a valid date! (like 25/12/2022)\n')
+
+        print()
+
+        # adds a day so books due on the last date are included
+        one_day = 24 * 60 * 60
 
-        # gets the time stamps
-        book_times = list(self.loaned_books.col_values(4))
+        self.print_due_books(lambda shard: shard.due_dates.due_between(
+            start, end + one_day), time.time())
 
-        for index in range(len(book_times)):
+    def view_report(self):
+        """This function shows a report about all the loaned books"""
+        print('This is the report for the loaned books:\n')
 
-            if (int(book_times[index]) <= threshold + time.time()):
-                # adds one as rows start at one instead of zero
-                due_books.append(index + 1)
+        try:
+            report = loan_report([shard.loaned_books.get_catalog()
+                                  for shard in self.shards],
+                                 time.time(), LOAN_TIME)
 
-        # puts the books name and owner into lists
-        for row in range(len(due_books)):
-            current_book = list(self.loaned_books.row_values(due_books[row]))
+        # numpy is not installed
+        except ImportError as error:
+            print('Sorry, {}.\n'.format(error))
+            return
 
-            book_names.append(current_book[0])
-            book_owners.append(current_book[2])
-            difference = round(int(current_book[3]) - int(time.time()), 0)
-            #                          (seconds to days)
-            days_difference = round(difference / 86400, 2)
+        report.print_report()
 
-            time_till_due.append('{} days left'.format(days_difference))
+        print(self.spacer)
+
+    def print_due_books(self, find_rows, now):
+        """This function prints the books on the rows of the loaned
+        worksheets that find_rows(shard) gets from the shard's indexes"""
+        book_names = []
+        book_owners = []
+        time_till_due = []
+
+        for shard in self.shards:
+            # the worksheet is downloaded again (if it is old) before the
+            # rows are found, so the rows still point at the same books
+            # when they are read
+            shard.loaned_books.check_expired()
+
+            with shard.loaned_books.reading() as rows:
+                # puts the books name and owner into lists
+                # (in the order they are in the worksheets)
+                # (the due times were read as numbers when the sheet
+                # was loaded)
+                for row in sorted(find_rows(shard)):
+                    current_book = rows.record(row)
+
+                    book_names.append(current_book.title)
+                    book_owners.append(current_book.student)
+
+                    # the due time cell can be empty or not a number
+                    if (current_book.due_time is None):
+                        time_till_due.append('no due date')
+                        continue
+
+                    difference = round(int(current_book.due_time) - int(now),
+                                       0)
+                    #                          (seconds to days)
+                    days_difference = round(difference / 86400, 2)
+
+                    time_till_due.append('{} days left'.format(
+                        days_difference))
+
+        view_books([book_names, book_owners, time_till_due],
+                   self.view_delay, self.page_size)
+
+
+def finish_stats(stats, show_summary, json_file):
+    """This function shows or saves the request stats when the program ends"""
+    if (show_summary):
+        print()
+        stats.print_summary()
+
+    if (json_file is not None):
+        stats.export_json(json_file)
+
+
+def finish_writes(manager):
+    """This function sends the row stamps that are left when the program
+    ends and saves a snapshot for the next run"""
+    try:
+        with operation('exit'):
+            manager.flush()
+
+    except Exception:
+        print('Sorry, the last changes could not be saved to '
+              'google sheets.')
+
+    try:
+        manager.save_snapshot()
 
-        view_books([book_names, book_owners, time_till_due])
+    # the next run just downloads the worksheets
+    except OSError:
+        pass
 
 
 def main():
     """This is the main function for this
     program where everything is being run"""
 
+    parser = argparse.ArgumentParser(description='Library manager')
+    parser.add_argument('--sqlite', metavar='FILE',
+                        help='use a local database file instead of '
+                             'the google spreadsheet')
+    parser.add_argument('--key', metavar='KEY',
+                        help='open the spreadsheet by its key (the long id '
+                             'in its url) instead of searching for its name')
+    parser.add_argument('--import', dest='import_file', metavar='FILE',
+                        help='add all the books in a csv or jsonl file '
+                             'then exit')
+    parser.add_argument('--script', metavar='FILE',
+                        help='run the commands in a file (- for stdin) '
+                             'then exit, see batch_mode.py')
+    parser.add_argument('--stats', action='store_true',
+                        help='print how many requests were made at the end')
+    parser.add_argument('--stats-json', metavar='FILE',
+                        help='save the request stats to a json file '
+                             'at the end')
+    parser.add_argument('--shards', type=int, metavar='COUNT',
+                        help='spread the books over this many pairs of '
+                             'worksheets then exit (see shards.py)')
+    parser.add_argument('--compact', action='store_true',
+                        help='delete the gaps left by loaned and returned '
+                             'books then exit')
+    parser.add_argument('--no-snapshot', action='store_true',
+                        help='download the worksheets before starting '
+                             'instead of starting from the saved copy')
+    parser.add_argument('--slow', action='store_true',
+                        help='print books one row at a time')
+    parser.add_argument('--page-size', type=int, metavar='ROWS',
+                        help='how many books to print before asking '
+                             'to print more')
+    arguments = parser.parse_args()
+
     print('This is a library manager!')
-    print('~Please ensure that you are connected to the internet!~\n')
+
+    if (arguments.sqlite is None):
+        print('~Please ensure that you are connected to the internet!~\n')
+
+    # records the requests if they are going to be shown
+    stats = None
+    if (arguments.stats or arguments.stats_json is not None):
+        stats = session_stats()
+        atexit.register(finish_stats, stats, arguments.stats,
+                        arguments.stats_json)
 
     # make new object of 'library_manager' class
     try:
-        manager = library_manager()
+        with operation('startup'):
+            if (arguments.sqlite is not None):
+                manager = library_manager(sqlite_backend(arguments.sqlite),
+                                          stats=stats)
+
+            else:
+                snapshot_file = SNAPSHOT_FILE
+                if (arguments.no_snapshot):
+                    snapshot_file = None
+
+                manager = library_manager(
+                    sheets_backend(spreadsheet_key=arguments.key),
+                    stats=stats, snapshot_file=snapshot_file)
 
     # could find a differnet way to catch the specific error
     except:
         time.sleep(2)
         print('You are not connected!')
         sys.exit()
+
+    # the stamps that are left are sent before the stats are shown
+    atexit.register(finish_writes, manager)
+
+    if (arguments.slow):
+        manager.view_delay = 0.1
+
+    manager.page_size = arguments.page_size
+
+    # moves the books into the shards without showing the menu
+    if (arguments.shards is not None):
+        if (arguments.shards < 1):
+            print('There has to be at least 1 shard.')
+            sys.exit()
+
+        with operation('Reshard'):
+            manager.reshard(arguments.shards)
+        sys.exit()
+
+    # deletes the gaps without showing the menu
+    if (arguments.compact):
+        with operation('Compact'):
+            manager.compact()
+        sys.exit()
+
+    # imports the books without showing the menu
+    if (arguments.import_file is not None):
+        with operation('Import Books'):
+            manager.import_books(arguments.import_file)
+        sys.exit()
+
+    # runs the commands without showing the menu
+    if (arguments.script == '-'):
+        run_script(manager, sys.stdin)
+        sys.exit()
+
+    elif (arguments.script is not None):
+        with open(arguments.script, newline='', encoding='utf-8') as script:
+            run_script(manager, script)
+        sys.exit()
+
+    # book names can be finished by pressing tab
+    enable_completion(manager.shards.search_indexes())
+
     # this list contains all the functions to be referenced later
 
     # to add more functions,
@@ -419,7 +1126,12 @@ def main():
                ['Return Book', manager.return_book],
                ['View Available Books', manager.view_available],
                ['View Loaned Books', manager.view_loaned],
-               ['View Due Books', manager.view_due]]
+               ['View Due Books', manager.view_due],
+               ['View Overdue Books', manager.view_overdue],
+               ['View Books Due Between Dates', manager.view_due_between],
+               ['View Loan Report', manager.view_report],
+               ["View A Student's Books", manager.view_student],
+               ["Return A Student's Books", manager.return_student]]
     # exit number is used so the menu can be added to quickly
     exit_number = len(OPTIONS) + 1
     user_choice = 0
@@ -442,7 +1154,16 @@ def main():
         print('_______________________________________________\n')
         if (user_choice != exit_number):
             # runs the specified function (index 1 of nested list)
-            OPTIONS[user_choice - 1][1]()
+            try:
+                with operation(OPTIONS[user_choice - 1][0]):
+                    # gets what the other clerks have changed first
+                    manager.sync()
+                    OPTIONS[user_choice - 1][1]()
+
+            # google sheets is still busy after trying again a few times
+            except request_failed:
+                print('Sorry, google sheets is too busy right now, '
+                      'please try again in a minute.\n')
 
     print('Thanks for using this program!')
 
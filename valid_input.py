@@ -1,3 +1,25 @@
+import time
+
+# this dict turns the fiction options into what is written in the worksheet
+FICTION_NAMES = {'f': 'fiction', 'nf': 'non fiction',
+                 'fiction': 'fiction', 'non fiction': 'non fiction'}
+
+def valid_name(text):
+    """This function checks if a name is valid (not digits or empty)"""
+    return (not text.isdigit()) and text != ''
+
+def valid_book(book_name, is_fiction):
+    """This function checks a book that was not typed in (from a file, script or request)
+    the same way as str_valid_input and list_valid_input,
+    it returns the row to write ([name, fiction]) or None if it is not valid"""
+    book_name = book_name.lower().strip()
+    is_fiction = is_fiction.lower().strip()
+    
+    if (not valid_name(book_name) or not is_fiction in FICTION_NAMES):
+        return None
+    
+    return [book_name, FICTION_NAMES[is_fiction]]
+
 def list_valid_input(input_message, error_message, valid_entries):
     """This function gets valid string input that is in a list (valid_entries)"""
     user_input = ''
@@ -35,10 +57,24 @@ def str_valid_input(input_message, error_message):
     while not is_valid:
         user_input = input(input_message).lower().strip()
         
-        if ((not user_input.isdigit()) and user_input != ''):
+        if (valid_name(user_input)):
             is_valid = True
         
         else:
             print(error_message)
     
     return user_input
+
+def date_valid_input(input_message, error_message, date_format='%d/%m/%Y'):
+    """This function gets a valid date and returns it as a time stamp (seconds)"""
+    is_valid = False
+    
+    while not is_valid:
+        try:
+            user_input = time.mktime(time.strptime(input(input_message).strip(), date_format))
+            is_valid = True
+        
+        except ValueError:
+            print(error_message)
+    
+    return user_input
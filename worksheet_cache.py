@@ -0,0 +1,861 @@
+"""
+Filename: worksheet_cache.py
+Description: This file keeps a local copy of a worksheet so that
+    the library manager does not have to download whole
+    coloumns every time it looks something up.
+
+    The cache has the same functions as a gspread worksheet
+    (col_values, row_values, get, range, update, update_cells, clear)
+    so it can be passed to the functions in v3.py in place of a worksheet.
+    Reads come from the local copy, writes go to the worksheet
+    and are copied into the local copy as well.
+
+    Indexes (see book_index.py) can be added to a cache,
+    they are told about every row that changes so they never go out of date.
+
+    A cache can start from a snapshot (see snapshot.py) while the
+    worksheet is downloaded in the background, reads are served from the
+    snapshot straight away but finding a row to change and writing wait
+    until the download has finished (see reconcile).
+
+    A cache can stamp every row it writes (stamp_rows) with a short hash
+    of the row in the STAMP_COL coloumn, so the rows other clerks have
+    changed can be found by reading just that coloumn (see delta_sync.py).
+    The stamps are kept apart from the rows (they are not in the catalog).
+
+    More than one clerk can use the library at once, so the writes that
+    depend on where other rows are do not trust the local copy:
+        append_rows     - the worksheet picks the rows (after its last row)
+        add_rows        - puts rows in the gaps left by moved books
+                          (checked with verify_rows first) then appends,
+                          two clerks can still fill the same gap if they
+                          check it at the same moment (sheets can not
+                          write only if a cell is empty)
+        verify_rows     - downloads rows again just before they are changed
+                          to check nobody else has changed them
+        delete_row_ranges - deletes rows in the worksheet itself, so the
+                          rows below move up without being written again
+        batch_clear     - empties the rows books are moved from straight
+                          away, so other clerks see the books have gone
+
+    Every write is sent straight away, the stamps of the rows it changed
+    are sent after it in one batch_update (see flush), if they can not
+    be sent they are tried again with the next write or sync.
+"""
+
+import contextlib
+import threading
+import time
+import zlib
+# other files
+from book_index import book_index
+from gap_index import gap_index
+from catalog import catalog
+from instrumentation import operation
+from storage import (parse_range, col_to_letter, cell_text, trim_row, cell,
+                     appended_row)
+
+
+# the coloumn each row's stamp is kept in (Z), see stamp_rows
+STAMP_COL = 26
+
+
+def row_stamp(values):
+    """This function makes a short hash of a row's text
+    ('' for an empty row, so clearing a row clears its stamp)"""
+    values = trim_row(values)
+
+    if (values == []):
+        return ''
+
+    return '{:08x}'.format(zlib.crc32('\x1f'.join(values).encode('utf-8')))
+
+
+def row_runs(rows):
+    """This function splits rows into runs of rows next to each other
+    and returns a list of (first row, last row)"""
+    runs = []
+
+    for row in sorted(rows):
+        if (runs != [] and runs[-1][1] == row - 1):
+            runs[-1] = (runs[-1][0], row)
+
+        else:
+            runs.append((row, row))
+
+    return runs
+
+
+def range_data(blocks):
+    """This function turns blocks of cells into batch_update data"""
+    return [{'range': '{}{}:{}{}'.format(
+                 col_to_letter(block['cols'][0]), block['first_row'],
+                 col_to_letter(block['cols'][1]), block['last_row']),
+             'values': block['values']}
+            for block in blocks]
+
+
+def split_stamps(rows):
+    """This function takes the stamps out of a worksheet's rows and
+    returns (the rows without them, the stamps)"""
+    # most worksheets have never been stamped
+    if (all([len(row) < STAMP_COL for row in rows])):
+        return rows, []
+
+    stamps = [row[STAMP_COL - 1] if len(row) >= STAMP_COL else ''
+              for row in rows]
+
+    return [row[:STAMP_COL - 1] for row in rows], stamps
+
+
+class worksheet_cache():
+
+    def __init__(self, worksheet, rows=None, refresh_time=None,
+                 stamp_rows=False):
+        """This function sets up the cache for a worksheet
+
+        rows is the worksheet's values (or a catalog) if they have
+        already been downloaded (otherwise they are downloaded here)
+        refresh_time is how many seconds the local copy is trusted
+        for before it is downloaded again (None to never download again)
+        stamp_rows is True to stamp every row that is written
+        (see delta_sync.py)"""
+        self.worksheet = worksheet
+        self.refresh_time = refresh_time
+
+        # the rows, stored by coloumn (see catalog.py)
+        self.rows = catalog()
+        self.loaded_at = 0
+
+        # the empty rows left behind by moved books, new rows are
+        # put in them first (see add_rows and gap_index.py)
+        self.gaps = gap_index(1)
+
+        # these get told when rows change (see add_index)
+        self.indexes = [self.gaps]
+
+        self.stamp_rows = stamp_rows
+
+        # the stamp of each row in the worksheet (the last ones read or
+        # sent) and the rows that have changed since they were stamped
+        self.stamps = []
+        self.unstamped_rows = set()
+
+        # the lock stops the local copy changing while the stamps
+        # are being worked out, the flush lock makes sure flushes
+        # are sent one at a time (in order)
+        self.lock = threading.RLock()
+        self.flush_lock = threading.Lock()
+
+        # set once the worksheet has been downloaded
+        # when the cache starts from a snapshot (see reconcile)
+        self.reconciled = threading.Event()
+        self.reconciled.set()
+        self.snapshot_stale = False
+        self.downloaded_rows = None
+
+        if (rows is None):
+            self.refresh()
+
+        else:
+            self.load(rows)
+
+    @property
+    def title(self):
+        return self.worksheet.title
+
+    def load(self, rows):
+        """This function replaces the local copy with the given rows"""
+        if (not isinstance(rows, catalog)):
+            rows, stamps = split_stamps(rows)
+            rows = catalog(rows)
+
+        else:
+            stamps = self.stamps
+
+        with self.lock:
+            self.rows = rows
+            self.stamps = stamps
+            self.trim()
+            self.loaded_at = time.time()
+
+            for index in self.indexes:
+                index.load(self.rows)
+
+    def refresh(self):
+        """This function downloads the whole worksheet in one request"""
+        # the stamps waiting to be sent are sent first so they are not lost
+        self.flush()
+
+        self.load(self.worksheet.get_all_values())
+
+    def check_expired(self):
+        """This function downloads the worksheet again
+        if the local copy is older than refresh_time"""
+        self.apply_download()
+
+        if (self.refresh_time is not None and
+                time.time() - self.loaded_at >= self.refresh_time):
+            self.refresh()
+
+    # --- starting from a snapshot ---
+
+    def start_reconcile(self):
+        """This function marks the local copy as coming from a snapshot,
+        until reconcile is given the downloaded rows"""
+        self.snapshot_stale = True
+        self.reconciled.clear()
+
+    def reconcile(self, rows):
+        """This function is given the worksheet's rows once they have
+        been downloaded in the background (None if it failed), they are
+        put in the local copy by the next read or write (apply_download)
+        so the local copy only ever changes in the main thread"""
+        self.downloaded_rows = rows
+        self.reconciled.set()
+
+    def apply_download(self):
+        """This function replaces the snapshot with the downloaded rows
+        if they have been downloaded and are different"""
+        if (not self.snapshot_stale or not self.reconciled.is_set()):
+            return
+
+        rows = self.downloaded_rows
+        self.downloaded_rows = None
+
+        # the download failed, so it is tried again now
+        # (nothing has been written yet, so there is nothing to flush)
+        if (rows is None):
+            self.load(self.worksheet.get_all_values())
+
+        else:
+            rows, stamps = split_stamps(rows)
+            rows = catalog(rows)
+            rows.trim()
+
+            self.stamps = stamps
+
+            if (rows != self.rows):
+                with self.lock:
+                    self.load(rows)
+
+            self.loaded_at = time.time()
+
+        self.snapshot_stale = False
+
+    def reconciling(self):
+        """This function checks if the worksheet is still being downloaded
+        (if the cache started from a snapshot)"""
+        self.apply_download()
+
+        return self.snapshot_stale
+
+    def wait_reconciled(self):
+        """This function waits for the worksheet to be downloaded
+        (if the cache started from a snapshot), before a row is changed"""
+        if (self.snapshot_stale):
+            self.reconciled.wait()
+            self.apply_download()
+
+    def add_index(self, index):
+        """This function adds an index which will be kept up to date
+        with the rows in this worksheet"""
+        index.load(self.rows)
+        self.indexes.append(index)
+
+    def trim(self):
+        """This function gets rid of empty rows at the bottom of the sheet"""
+        self.rows.trim()
+
+    # --- reads (served from the local copy) ---
+
+    def value(self, row, col):
+        """This function gets the text of one cell (rows and cols start at 1)"""
+        return self.rows.value(row, col)
+
+    def get_all_values(self):
+        self.check_expired()
+
+        rows = [self.rows.row_values(row)
+                for row in range(1, len(self.rows) + 1)]
+        width = max([len(row) for row in rows], default=0)
+
+        return [row + [''] * (width - len(row)) for row in rows]
+
+    def col_values(self, col):
+        self.check_expired()
+
+        return trim_row(self.rows.column(col))
+
+    def row_values(self, row):
+        self.check_expired()
+
+        return self.rows.row_values(row)
+
+    def gap_rows(self):
+        """This function gets the empty rows above the last row"""
+        self.check_expired()
+
+        return self.gaps.gaps(len(self.rows))
+
+    @contextlib.contextmanager
+    def reading(self):
+        """This function keeps the local copy (and its indexes) from
+        changing while another thread reads it, it is not downloaded
+        again here (the thread that changes the rows does that)
+
+            with worksheet.reading() as rows:
+                ..."""
+        with self.lock:
+            yield self.rows
+
+    def get_catalog(self):
+        """This function gets the whole local copy (see catalog.py)"""
+        self.check_expired()
+
+        return self.rows
+
+    def record(self, row):
+        """This function gets a row as a book_record (see catalog.py)"""
+        self.check_expired()
+
+        return self.rows.record(row)
+
+    def get(self, range_name):
+        """This function gets the values in a range, empty cells
+        and rows at the end are left out like the sheets API does"""
+        self.check_expired()
+
+        first_row, first_col, last_row, last_col = parse_range(range_name)
+
+        if (last_row is None):
+            last_row = len(self.rows)
+
+        values = []
+
+        for row in range(first_row, min(last_row, len(self.rows)) + 1):
+            row_values = self.rows.row_values(row)
+            row_end = len(row_values)
+
+            if (last_col is not None):
+                row_end = min(row_end, last_col)
+
+            values.append(trim_row(row_values[first_col - 1:row_end]))
+
+        # empty rows at the end are not sent back by the sheets API
+        while values != [] and values[-1] == []:
+            values.pop()
+
+        return values
+
+    def find_row(self, value, col):
+        """This function finds the first row that has a value in a coloumn
+        (-1 if it is not found), using an index if there is one"""
+        # the row is found to be changed, so it has to be up to date
+        self.wait_reconciled()
+        self.check_expired()
+
+        for index in self.indexes:
+            if (isinstance(index, book_index) and index.col == col):
+                return index.find(value)
+
+        col_items = self.col_values(col)
+
+        if (value in col_items):
+            return col_items.index(value) + 1
+
+        return -1
+
+    def batch_get(self, ranges):
+        return [self.get(range_name) for range_name in ranges]
+
+    def range(self, range_name):
+        """This function gets all the cells in a range (including empty ones)"""
+        self.check_expired()
+
+        first_row, first_col, last_row, last_col = parse_range(range_name)
+
+        if (last_row is None):
+            last_row = len(self.rows)
+
+        if (last_col is None):
+            last_col = max([len(self.rows.row_values(row))
+                            for row in range(1, len(self.rows) + 1)],
+                           default=first_col)
+
+        return [cell(row, col, self.value(row, col))
+                for row in range(first_row, last_row + 1)
+                for col in range(first_col, last_col + 1)]
+
+    # --- writes (sent to the worksheet then copied locally) ---
+
+    def change_row(self, row, changes, remote=False):
+        """This function changes cells in one row of the local copy
+        changes is a list of (col, value) and the indexes are told about it
+        remote is True if the change came from the worksheet
+        (so it does not have to be sent)"""
+        old_row = self.rows.row_values(row)
+
+        if (self.stamp_rows and not remote):
+            self.unstamped_rows.add(row)
+
+        for col, value in changes:
+            self.rows.set_value(row, col, cell_text(value))
+
+        new_row = self.rows.row_values(row)
+
+        for index in self.indexes:
+            index.row_changed(row, old_row, new_row)
+
+    def write_values(self, first_row, first_col, values):
+        """This function writes a block of values into the local copy"""
+        for row_offset in range(len(values)):
+            changes = [(first_col + col_offset, value) for col_offset, value
+                       in enumerate(values[row_offset])]
+
+            self.change_row(first_row + row_offset, changes)
+
+        self.trim()
+
+    def clear_values(self, range_name, remote=False):
+        """This function empties a range in the local copy
+        (remote is True if it has already been cleared in the worksheet)"""
+        first_row, first_col, last_row, last_col = parse_range(range_name)
+
+        if (last_row is None):
+            last_row = len(self.rows)
+
+        for row in range(first_row, min(last_row, len(self.rows)) + 1):
+            row_end = len(self.rows.row_values(row))
+
+            if (last_col is not None):
+                row_end = min(row_end, last_col)
+
+            self.change_row(row, [(col, '') for col in
+                                  range(first_col, row_end + 1)], remote)
+
+        self.trim()
+
+    def send(self, name, *arguments):
+        """This function sends a write to the worksheet"""
+        self.wait_reconciled()
+
+        return getattr(self.worksheet, name)(*arguments)
+
+    def update(self, range_name, values):
+        response = self.send('update', range_name, values)
+
+        with self.lock:
+            first_row, first_col, _, _ = parse_range(range_name)
+            self.write_values(first_row, first_col, values)
+
+        self.written()
+
+        return response
+
+    def batch_update(self, data):
+        response = self.send('batch_update', data)
+
+        with self.lock:
+            for block in data:
+                first_row, first_col, _, _ = parse_range(block['range'])
+                self.write_values(first_row, first_col, block['values'])
+
+        self.written()
+
+        return response
+
+    def update_cells(self, cells):
+        response = self.send('update_cells', cells)
+
+        # groups the cells by row so each row is only changed once
+        row_changes = {}
+
+        for changed_cell in cells:
+            row_changes.setdefault(changed_cell.row, []).append(
+                (changed_cell.col, changed_cell.value))
+
+        with self.lock:
+            for row in row_changes:
+                self.change_row(row, row_changes[row])
+
+            self.trim()
+
+        self.written()
+
+        return response
+
+    def append_rows(self, values):
+        """This function adds rows after the last row of the worksheet,
+        the worksheet picks where they go so two clerks adding books at
+        the same time are not given the same rows"""
+        self.wait_reconciled()
+
+        # the stamps waiting to be sent are sent first,
+        # as rows can be moved down
+        self.flush()
+
+        # the stamps are sent with the rows
+        stamps = [row_stamp([cell_text(value) for value in row_values])
+                  for row_values in values]
+
+        sent_values = values
+        if (self.stamp_rows):
+            sent_values = [list(row_values) +
+                           [''] * (STAMP_COL - 1 - len(row_values)) + [stamp]
+                           for row_values, stamp in zip(values, stamps)]
+
+        # rows are inserted if the worksheet has gaps above its last row,
+        # so nothing is written over
+        response = self.worksheet.append_rows(sent_values, 'RAW',
+                                              'INSERT_ROWS')
+
+        first_row = appended_row(response)
+        if (first_row is None):
+            first_row = len(self.rows) + 1
+
+        # the rows below were moved down to make space,
+        # so the whole worksheet is downloaded again
+        if (first_row <= len(self.rows)):
+            self.refresh()
+
+            return response
+
+        with self.lock:
+            for offset in range(len(values)):
+                self.change_row(first_row + offset,
+                                list(enumerate(values[offset], 1)),
+                                remote=True)
+
+                if (self.stamp_rows):
+                    self.set_stamp(first_row + offset, stamps[offset])
+
+            self.trim()
+
+        return response
+
+    def add_rows(self, values):
+        """This function adds rows in the gaps first (smallest first)
+        and after the last row of the worksheet once they are full
+
+        The gaps are downloaded again just before they are written,
+        in case someone else has put a book in them"""
+        self.wait_reconciled()
+
+        gap_rows = self.gap_rows()[:len(values)]
+
+        if (gap_rows != []):
+            filled_rows = self.verify_rows(gap_rows)
+            gap_rows = [row for row in gap_rows if row not in filled_rows]
+
+        if (gap_rows != []):
+            self.batch_update([{'range': 'A{0}:{1}{0}'.format(
+                                    row, col_to_letter(len(row_values))),
+                                'values': [row_values]}
+                               for row, row_values
+                               in zip(gap_rows, values)])
+
+        # the books go after the last row if the gaps were full
+        # (or someone else filled them before they were sent)
+        left_over = [row_values for row, row_values in zip(gap_rows, values)
+                     if self.value(row, 1) != cell_text(row_values[0])]
+        left_over += values[len(gap_rows):]
+
+        if (left_over != []):
+            self.append_rows(left_over)
+
+    def batch_clear(self, ranges):
+        """This function empties ranges (the rows books are moved from),
+        so another clerk checking the rows (verify_rows) sees that the
+        books have gone and does not move them as well"""
+        self.wait_reconciled()
+
+        # the stamps waiting to be sent are sent first
+        # so they do not stamp the empty rows
+        self.flush()
+
+        response = self.worksheet.batch_clear(ranges)
+
+        with self.lock:
+            for range_name in ranges:
+                self.clear_values(range_name, remote=True)
+
+                first_row, _, last_row, last_col = parse_range(range_name)
+                if (last_row is None):
+                    last_row = len(self.rows)
+
+                for row in range(first_row, last_row + 1):
+                    # the stamp was cleared with the row
+                    if (last_col is None or last_col >= STAMP_COL):
+                        self.set_stamp(row, '')
+
+                    elif (self.stamp_rows):
+                        self.unstamped_rows.add(row)
+
+            self.trim()
+
+        self.written()
+
+        return response
+
+    def clear(self):
+        response = self.send('clear')
+
+        with self.lock:
+            # the stamps are cleared as well
+            if (self.stamp_rows):
+                self.unstamped_rows.update(range(1, len(self.rows) + 1))
+
+            self.rows = catalog()
+
+            for index in self.indexes:
+                index.load(self.rows)
+
+        self.written()
+
+        return response
+
+    def delete_row_ranges(self, row_ranges):
+        """This function deletes rows (a list of (first_row, last_row))
+        in the worksheet, the rows below them move up"""
+        self.wait_reconciled()
+
+        # the stamps waiting to be sent are sent first,
+        # as their rows are about to move
+        self.flush()
+
+        response = self.worksheet.delete_row_ranges(row_ranges)
+
+        deleted = [row for first_row, last_row in row_ranges
+                   for row in range(first_row, last_row + 1)]
+
+        with self.lock:
+            self.rows.delete_rows(deleted)
+
+            deleted = set(deleted)
+            self.stamps = [stamp for row, stamp in enumerate(self.stamps, 1)
+                           if row not in deleted]
+
+            self.trim()
+
+            for index in self.indexes:
+                index.load(self.rows)
+
+        return response
+
+    def verify_rows(self, rows, col=1):
+        """This function downloads rows again (in one request) to check
+        that nobody else has changed them since they were read, the
+        local copy is updated and the rows whose value in col has changed
+        are returned (found again they might have moved)"""
+        self.wait_reconciled()
+
+        # the stamps waiting to be sent are sent first,
+        # otherwise the rows would look like someone else has changed them
+        self.flush()
+
+        rows_values, stamps = self.download_rows(rows)
+
+        with self.lock:
+            changed_rows = [row for row in sorted(rows_values)
+                            if self.value(row, col) !=
+                            (rows_values[row][col - 1]
+                             if len(rows_values[row]) >= col else '')]
+
+            self.apply_rows(dict((row, values) for row, values
+                                 in rows_values.items()
+                                 if values != self.rows.row_values(row)),
+                            stamps)
+
+        return changed_rows
+
+    def download_rows(self, rows):
+        """This function downloads rows (in one request) and returns
+        ({row: values}, {row: stamp})"""
+        runs = row_runs(set(rows))
+
+        ranges_values = self.worksheet.batch_get(
+            ['A{}:{}{}'.format(first_row, col_to_letter(STAMP_COL), last_row)
+             for first_row, last_row in runs])
+
+        rows_values = {}
+        stamps = {}
+
+        for (first_row, last_row), values in zip(runs, ranges_values):
+            values, run_stamps = split_stamps(list(values))
+
+            for row in range(first_row, last_row + 1):
+                offset = row - first_row
+
+                # empty rows at the end are not sent back
+                rows_values[row] = []
+                if (offset < len(values)):
+                    rows_values[row] = trim_row(values[offset])
+
+                stamps[row] = ''
+                if (offset < len(run_stamps)):
+                    stamps[row] = run_stamps[offset]
+
+        return rows_values, stamps
+
+    # --- stamps ---
+
+    def written(self):
+        """This function sends the stamps of the rows that were just
+        written (if they can not be sent they are tried again with the
+        next write or sync)"""
+        if (self.unstamped_rows == set()):
+            return
+
+        try:
+            self.flush()
+
+        except Exception:
+            pass
+
+    def stamp_ranges(self, rows):
+        """This function makes the batch_update data for the stamps of rows
+        and returns (data, {row: stamp})"""
+        stamps = dict((row, row_stamp(self.rows.row_values(row)))
+                      for row in rows)
+
+        data = []
+        for first_row, last_row in row_runs(rows):
+            data.append({'first_row': first_row, 'last_row': last_row,
+                         'cols': (STAMP_COL, STAMP_COL),
+                         'values': [[stamps[row]] for row
+                                    in range(first_row, last_row + 1)]})
+
+        return range_data(data), stamps
+
+    def set_stamp(self, row, stamp):
+        self.stamps += [''] * (row - len(self.stamps))
+        self.stamps[row - 1] = stamp
+
+    # --- delta sync (see delta_sync.py) ---
+
+    def changed_rows(self, stamps):
+        """This function compares the stamps read from the worksheet
+        with the last ones read or sent, and returns the rows that
+        have been changed by someone else
+
+        Rows without a stamp in the worksheet (written before rows were
+        stamped, or by hand) are also downloaded if there is something
+        in them here, as emptying them does not change their stamp"""
+        rows = []
+
+        for row in range(1, max(len(stamps), len(self.stamps),
+                                len(self.rows)) + 1):
+            stamp = stamps[row - 1] if row <= len(stamps) else ''
+            local_stamp = ''
+            if (row <= len(self.stamps)):
+                local_stamp = self.stamps[row - 1]
+
+            if (stamp != local_stamp or
+                    (stamp == '' and row <= len(self.rows) and
+                     self.rows.row_values(row) != [])):
+                rows.append(row)
+
+        return rows
+
+    def apply_rows(self, rows_values, stamps):
+        """This function puts rows downloaded from the worksheet
+        ({row: values}) into the local copy, with their stamps"""
+        with self.lock:
+            for row, values in rows_values.items():
+                old_width = len(self.rows.row_values(row))
+
+                changes = [(col, values[col - 1] if col <= len(values)
+                            else '')
+                           for col in range(1, max(old_width,
+                                                   len(values)) + 1)]
+
+                self.change_row(row, changes, remote=True)
+                self.set_stamp(row, stamps.get(row, ''))
+
+                # rows that were not stamped are stamped now,
+                # so they are not downloaded every time
+                if (self.stamp_rows and stamps.get(row, '') == '' and
+                        self.rows.row_values(row) != []):
+                    self.unstamped_rows.add(row)
+
+            self.trim()
+
+    def flush(self):
+        """This function sends the stamps of the rows that have been
+        written since the last flush in one batch_update"""
+        with self.flush_lock:
+            with self.lock:
+                if (self.unstamped_rows == set()):
+                    return
+
+                unstamped_rows = self.unstamped_rows
+                self.unstamped_rows = set()
+
+                data, stamps = self.stamp_ranges(unstamped_rows)
+
+            try:
+                with operation('flush stamps'):
+                    self.worksheet.batch_update(data)
+
+            except Exception:
+                # they are sent with the next flush
+                with self.lock:
+                    self.unstamped_rows.update(unstamped_rows)
+
+                raise
+
+            with self.lock:
+                for row, stamp in stamps.items():
+                    self.set_stamp(row, stamp)
+
+
+def load_caches(backend, titles, refresh_time=None, snapshot=None,
+                stamp_rows=False):
+    """This function downloads every worksheet at once (one request
+    for google sheets) and returns a cache for each of them
+
+    snapshot is a dict of title -> catalog (see snapshot.py), if it has
+    every worksheet the caches start from it and the worksheets are
+    downloaded in the background instead"""
+    worksheets = backend.open_worksheets(titles)
+
+    if (snapshot is not None and
+            all([title in snapshot for title in titles])):
+        caches = [worksheet_cache(worksheet, snapshot[title], refresh_time,
+                                  stamp_rows)
+                  for worksheet, title in zip(worksheets, titles)]
+
+        for cache in caches:
+            cache.start_reconcile()
+
+        threading.Thread(target=download_caches, args=(backend, caches),
+                         daemon=True).start()
+
+        return caches
+
+    worksheets_values = backend.batch_get_values(worksheets)
+
+    caches = []
+
+    for worksheet, rows in zip(worksheets, worksheets_values):
+        caches.append(worksheet_cache(worksheet, rows, refresh_time,
+                                      stamp_rows))
+
+    return caches
+
+
+def download_caches(backend, caches):
+    """This function downloads the worksheets of caches that started
+    from a snapshot (in one request) and gives them their rows"""
+    try:
+        with operation('reconcile snapshot'):
+            worksheets_values = backend.batch_get_values(
+                [cache.worksheet for cache in caches])
+
+    # each cache tries again itself when it is next used
+    except Exception:
+        worksheets_values = [None] * len(caches)
+
+    for cache, rows in zip(caches, worksheets_values):
+        cache.reconcile(rows)